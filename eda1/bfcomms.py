@@ -11,55 +11,22 @@ On exit (eg, with a control-C or a 'kill' command), it:
     -Exits.
 """
 
-import atexit
-import datetime
 import logging
-from logging import handlers
-import signal
 import sys
 import time
 
 # noinspection PyUnresolvedReferences
 import RPi.GPIO as GPIO
 # noinspection PyUnresolvedReferences
-import smbus
+from smbus2 import SMBus
 
+import common
 from mwabf import beamformer
 
 # set up the logging
-LOGLEVEL_CONSOLE = logging.INFO  # Logging level for console messages (INFO, DEBUG, ERROR, CRITICAL, etc)
-LOGLEVEL_LOGFILE = logging.DEBUG  # Logging level for logfile
 LOGFILE = "/tmp/bfcomms.log"
 
-
-class MWALogFormatter(logging.Formatter):
-    def format(self, record):
-        return "%s:%s - %s" % (datetime.datetime.now().isoformat(sep=' ')[:-7],
-                               record.levelname,
-                               record.getMessage())
-
-
-mwalf = MWALogFormatter()
-
 LOGGER = logging.getLogger()
-LOGGER.setLevel(logging.DEBUG)
-LOGGER.handlers = []
-LOGGER.propagate = False
-
-fh = handlers.RotatingFileHandler(LOGFILE,
-                                  maxBytes=1000000000,
-                                  backupCount=5)  # 1 Gb per file, max of five old log files
-fh.setLevel(LOGLEVEL_LOGFILE)
-fh.setFormatter(mwalf)
-
-ch = logging.StreamHandler()
-ch.setLevel(LOGLEVEL_CONSOLE)
-ch.setFormatter(mwalf)
-
-# add the handlers to the logger
-LOGGER.addHandler(fh)
-LOGGER.addHandler(ch)
-
 
 # IO pin allocations as (txdata, txclock, rxdata) for each of the 8 RxDOC cards in this box, numbered 1-8
 IOPINS = {1:(29, 16, 40), 2:(26, 15, 38), 3:(24, 13, 37), 4:(23, 12, 36), 5:(22, 11, 35), 6:(21, 10, 33), 7:(19, 8, 32),
@@ -69,9 +36,6 @@ TEST_I2C_ADDRESS = 0x68   # Used on startup, to see if we are running on a power
 
 BFS = {}   # Dict with bfnum (1-8) as key, and mwabf.beamformer.BFHandler as values
 
-SIGNAL_HANDLERS = {}
-CLEANUP_FUNCTION = None
-
 
 def identify_hardware():
     """
@@ -79,7 +43,7 @@ def identify_hardware():
     :return:
     """
     try:
-        bus = smbus.SMBus(1)
+        bus = SMBus(1)
     except:
         return 'COMMS'
     try:
@@ -99,11 +63,9 @@ def init():
     """
     GPIO.setmode(GPIO.BOARD)  # Use board connector pin numbers to specify I/O pins
     GPIO.setwarnings(False)
-    for i in range(1, 9):
-        txdata, txclock, rxdata = IOPINS[i]
-        GPIO.setup(rxdata, GPIO.IN)
-        GPIO.setup(txdata, GPIO.OUT)
-        GPIO.setup(txclock, GPIO.OUT)
+    # Set up all the pins with the same direction in one call each, rather than one call per pin
+    GPIO.setup([IOPINS[i][2] for i in range(1, 9)], GPIO.IN)  # rxdata
+    GPIO.setup([IOPINS[i][j] for i in range(1, 9) for j in (0, 1)], GPIO.OUT)  # txdata and txclock
 
 
 def cleanup():
@@ -116,52 +78,16 @@ def cleanup():
     GPIO.cleanup()
 
 
-# noinspection PyUnusedLocal
-def SignalHandler(signum=None, frame=None):
-    """
-    Called when a signal is received that would result in the programme exit, if the
-    RegisterCleanup() function has been previously called to set the signal handlers and
-    define an exit function using the 'atexit' module.
-
-    Note that exit functions registered by atexit are NOT called when the programme exits due
-    to a received signal, so we must trap signals where possible. The cleanup function will NOT
-    be called when signal 9 (SIGKILL) is received, as this signal cannot be trapped.
-
-    :return: None
-    """
-    print("Signal %d received." % signum)
-    sys.exit(-signum)  # Called by signal handler, so exit with a return code indicating the signal received
-
-
-def RegisterCleanup(func):
-    """
-    Traps a number of signals that would result in the program exit, to make sure that the
-    function 'func' is called before exit. The calling process must define its own cleanup
-    function - typically this would delete any facility controller objects, so that any
-    processes they have started will be stopped.
-
-    We don't need to trap signal 2 (SIGINT), because this is internally handled by the python
-    interpreter, generating a KeyboardInterrupt exception - if this causes the process to exit,
-    the function registered by atexit.register() will be called automatically.
-
-    :return: None
-    """
-    global SIGNAL_HANDLERS, CLEANUP_FUNCTION
-    CLEANUP_FUNCTION = func
-    for sig in [3, 15]:
-        SIGNAL_HANDLERS[sig] = signal.signal(sig, SignalHandler)  # Register a signal handler
-    SIGNAL_HANDLERS[1] = signal.signal(1, signal.SIG_IGN)
-    # Register the passed CLEANUP_FUNCTION to be called on
-    # on normal programme exit, with no arguments.
-    atexit.register(CLEANUP_FUNCTION)
-
-
 if __name__ == '__main__':
+    common.setup_logging(LOGFILE, maxbytes=1000000000)  # 1 Gb per file
+
     if identify_hardware() != 'COMMS':
         LOGGER.critical("I2C device found - Can't run bfcomms.py on a power control Pi.")
         sys.exit(-1)
     init()
-    RegisterCleanup(cleanup)
+    common.RegisterCleanup(cleanup)
+
+    beamformer.set_realtime(logger=LOGGER)  # Keep bit timing steady while sending pointings
 
     for slot in range(1, 9):
         txd, txc, rxd = IOPINS[slot]
@@ -170,8 +96,18 @@ if __name__ == '__main__':
     # All zero delays - point at the zenith
     xdelays = [0] * 16
     ydelays = [0] * 16
+    bitstring = beamformer.gen_bitstring(xdelays, ydelays)  # The delays never change, so only encode them once
+    bflist = [BFS[bfnum] for bfnum in range(1, 9)]  # The same BFHandler instances, in slot order
+    deadline = time.monotonic()  # Pointings are scheduled every 10 seconds from here, so the period doesn't drift.
     while True:
-        for bfnum in range(1, 9):
-            temp, flags = BFS[bfnum].point(xdelays=xdelays, ydelays=ydelays)
-            LOGGER.info("bf %d bitstring sent, return flags=%d, temp=%4.1f." % (bfnum, flags, temp))
-        time.sleep(10)
+        # Point all eight beamformers at once
+        results = beamformer.point_many(bflist, xdelays=xdelays, ydelays=ydelays, bitstring=bitstring)
+        for bfnum, (temp, flags) in enumerate(results, start=1):
+            LOGGER.info("bf %d bitstring sent, return flags=%d, temp=%4.1f.", bfnum, flags, temp)
+        deadline += 10.0
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            LOGGER.warning("Pointing loop overran by %.3f seconds", -delay)
+            deadline = time.monotonic()
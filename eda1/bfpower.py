@@ -18,10 +18,9 @@ Make sure that this process is not running before connecting or disconnecting be
 sockets aren't 'live' with 48V DC.
 """
 
-import atexit
-import datetime
 import logging
-import signal
+import os
+import select
 import sys
 import threading
 import time
@@ -29,46 +28,14 @@ import time
 # noinspection PyUnresolvedReferences
 import RPi.GPIO as GPIO
 # noinspection PyUnresolvedReferences
-import smbus
+from smbus2 import SMBus, i2c_msg
 
-# set up the logging
+import common
 
-LOGLEVEL_CONSOLE = logging.INFO  # Logging level for console messages (INFO, DEBUG, ERROR, CRITICAL, etc)
-LOGLEVEL_LOGFILE = logging.DEBUG  # Logging level for logfile
-LOGLEVEL_REMOTE = logging.INFO
+# set up the logging
 LOGFILE = "/tmp/bfpower.log"
 
-
-class MWALogFormatter(logging.Formatter):
-    def format(self, record):
-        return "%s:%s - %s" % (datetime.datetime.now().isoformat(sep=' ')[:-7],
-                               record.levelname,
-                               record.getMessage())
-
-
-mwalf = MWALogFormatter()
-
 LOGGER = logging.getLogger()
-LOGGER.setLevel(logging.DEBUG)
-LOGGER.handlers = []
-LOGGER.propagate = False
-
-fh = logging.FileHandler(LOGFILE)
-fh.setLevel(LOGLEVEL_LOGFILE)
-fh.setFormatter(mwalf)
-
-ch = logging.StreamHandler()
-ch.setLevel(LOGLEVEL_CONSOLE)
-ch.setFormatter(mwalf)
-
-# rh = handlers.SysLogHandler(address=('mw-gw'))
-# rh.setLevel(LOGLEVEL_REMOTE)
-# rh.setFormatter(mwalf)
-
-# add the handlers to the logger
-LOGGER.addHandler(fh)
-LOGGER.addHandler(ch)
-# logger.addHandler(rh)
 
 STATUS = None
 
@@ -81,6 +48,11 @@ ADDRESSES = {1:0x68, 2:0x69, 3:0x6a, 4:0x6b, 5:0x6c, 6:0x6d, 7:0x6e, 8:0x6f}
 
 TEST_I2C_ADDRESS = 0x68   # Used on startup, to see if we are running on a power or comms Pi.
 
+CHECK_INTERVAL = 10.0  # Seconds between status checks, if neither alarm input changes state
+
+CURRENT_SCALE = 20e-6 / 0.02  # LTC4151 current, in Amps per ADU - 20uV per ADU, through a 0.02 Ohm shunt
+VOLTAGE_SCALE = 0.025  # LTC4151 voltage, in Volts per ADU - 25mV per ADU
+
 POWER48 = 32
 ALARMPOWER = 36
 ALARM48 = 38
@@ -88,10 +60,7 @@ DIGOUT1 = 33
 DIGOUT2 = 35
 DIGIN1 = 40
 
-BDICT = {False:'OFF', True:'ON'}
-
-SIGNAL_HANDLERS = {}
-CLEANUP_FUNCTION = None
+BDICT = {False:'OFF', True:'ON'}  # Also works for the 0/1 values returned by GPIO.input(), as 0 == False
 
 
 def identify_hardware():
@@ -100,7 +69,7 @@ def identify_hardware():
     :return:
     """
     try:
-        bus = smbus.SMBus(1)
+        bus = SMBus(1)
     except:
         return 'COMMS'
     try:
@@ -116,6 +85,8 @@ class RxDoC(object):
     """
     Class to monitor and control a single RxDoC card
     """
+    _bus_lock = threading.Lock()  # Shared by all cards, to stop I2C transactions on the common bus from overlapping
+
     def __init__(self, bfnum, enable_pin, power_pin, i2c_address, bus, logger=LOGGER):
         """
         Create an instance of an RxDoC controller.
@@ -124,7 +95,7 @@ class RxDoC(object):
         :param enable_pin: GPIO pin number for the beamformer enable pin on the RxDoC card
         :param power_pin: GPIO pin number for 48V power control to the RxDoC card
         :param i2c_address: Address of the LTC4151 on this RxDoC card
-        :param bus: An smbus.SMBus() instance for I2C communications
+        :param bus: An smbus2.SMBus() instance for I2C communications
         :param logger: Optional logging.Logger() instance
         """
         self.bfnum = bfnum
@@ -132,29 +103,49 @@ class RxDoC(object):
         self.power_pin = power_pin
         self.i2c_address = i2c_address
         self.bus = bus
+        # Pre-built (set register pointer, read data) message pair for the LTC4151, used by check().
+        self.ltc4151_msgs = (i2c_msg.write(i2c_address, [0]), i2c_msg.read(i2c_address, 4))
         self.logger = logger
         self.current = 0.0
         self.voltage = 0.0
-        self.enabled = bool(GPIO.input(self.enable_pin))
-        self.power = bool(GPIO.input(self.power_pin))
-        self.lock = threading.RLock()  # Used to control access to the hardware resources (i2C, GPIO) on the board
+        self.lock = threading.Lock()  # Used to control access to the GPIO pins and state for this card
+        self.enabled = 0
+        self.power = 0
+        self.resync()
 
-    def check(self):
+    def resync(self):
         """
-        Communicate with the hardware to update current pin states, voltage, and current values.
+        Read the enable and power output pins back, to update self.enabled and self.power. The pins are only ever
+        changed by this class, so after startup the state written is trusted, and this doesn't need to be called
+        on every check().
 
         :return: None
         """
         with self.lock:
-            self.enabled = bool(GPIO.input(self.enable_pin))
-            self.power = bool(GPIO.input(self.power_pin))
+            self.enabled = GPIO.input(self.enable_pin)
+            self.power = GPIO.input(self.power_pin)
+
+    def check(self):
+        """
+        Communicate with the hardware to update the voltage and current values. The pin states are not read back,
+        as they're tracked when the pins are written - call resync() to re-read them.
+
+        :return: None
+        """
+        with RxDoC._bus_lock:
             try:
-                data = self.bus.read_i2c_block_data(self.i2c_address, 0, 4)
-                self.current = ((data[0] * 16) + (data[1] / 16)) * 20e-6 / 0.02  # 20uV per ADU, through a 0.02 Ohm shunt
-                self.voltage = ((data[2] * 16) + (data[3] / 16)) * 0.025  # 25mV per ADU
+                self.bus.i2c_rdwr(*self.ltc4151_msgs)
+                data = bytes(self.ltc4151_msgs[1])
             except IOError:
+                data = None
+        with self.lock:
+            if data is None:
                 self.current = 0.0
                 self.voltage = 0.0
+            else:
+                # Each 12-bit value is sent MSB first, as 8 bits then the top nibble of the next byte.
+                self.current = ((data[0] << 4) | (data[1] >> 4)) * CURRENT_SCALE
+                self.voltage = ((data[2] << 4) | (data[3] >> 4)) * VOLTAGE_SCALE
 
     def __repr__(self):
         return "BF# %d: power=%3s, enable=%3s, voltage=%5.2f V, current=%4.0f mA" % (self.bfnum,
@@ -163,12 +154,13 @@ class RxDoC(object):
                                                                                      self.voltage,
                                                                                      self.current * 1000)
 
-    def enable_bf(self):
+    def enable_bf(self, verify=False):
         """
         Turn on the output power enable FET on the RxDoC card. This must be called _after_ powering up the DoC card.
 
         Return True if there were no errors, False if there was an error, None if the DoC card was off when called.
 
+        :param verify: If True, read back the pin state to confirm the change, instead of trusting the value written.
         :return: boolean, True for success, False for failure
         """
         if not self.power:
@@ -177,30 +169,32 @@ class RxDoC(object):
         self.logger.debug('RxDoC - Turning ON 48V to beamformer')
         with self.lock:
             GPIO.output(self.enable_pin, 1)
-            self.enabled = bool(GPIO.input(self.enable_pin))
-        return self.enabled is True
+            self.enabled = GPIO.input(self.enable_pin) if verify else 1
+        return self.enabled == 1
 
-    def disable_bf(self):
+    def disable_bf(self, verify=False):
         """
         Turn off the output power enable FET on the RxDoC card.
 
         Return True if there were no errors, False if there was an error.
 
+        :param verify: If True, read back the pin state to confirm the change, instead of trusting the value written.
         :return: boolean, True for success, False for failure
         """
         self.logger.debug('RxDoC - Turning OFF 48V to beamformer')
         with self.lock:
             GPIO.output(self.enable_pin, 0)
-            self.enabled = bool(GPIO.input(self.enable_pin))
-        return self.enabled is False
+            self.enabled = GPIO.input(self.enable_pin) if verify else 0
+        return self.enabled == 0
 
-    def turnon_doc(self):
+    def turnon_doc(self, verify=False):
         """
         Switch the power on to the RxDoC card, using the FET on the BF Controller board. If the beamformer is enabled
         when this method is called, it will be automatically disabled before power is turned on.
 
         Return True if there were no errors, False if there was an error.
 
+        :param verify: If True, read back the pin state to confirm the change, instead of trusting the value written.
         :return: boolean, True for success, False for failure
         """
         if self.enabled:
@@ -209,16 +203,17 @@ class RxDoC(object):
         self.logger.debug('RxDoC - Turning ON 48V to DoC card')
         with self.lock:
             GPIO.output(self.power_pin, 1)
-            self.power = bool(GPIO.input(self.power_pin))
-        return self.power is True
+            self.power = GPIO.input(self.power_pin) if verify else 1
+        return self.power == 1
 
-    def turnoff_doc(self):
+    def turnoff_doc(self, verify=False):
         """
         Switch the power off to the RxDoC card, using the FET on the BFIF board. If the beamformer is enabled
         when this method is called, it will be automatically disabled before power is turned off.
 
         Return True if there were no errors, False if there was an error.
 
+        :param verify: If True, read back the pin state to confirm the change, instead of trusting the value written.
         :return: boolean, True for success, False for failure
         """
         if self.enabled:
@@ -227,8 +222,8 @@ class RxDoC(object):
         self.logger.debug('RxDoC - Turning OFF 48V to DoC card')
         with self.lock:
             GPIO.output(self.power_pin, 0)
-            self.power = bool(GPIO.input(self.power_pin))
-        return self.power is False
+            self.power = GPIO.input(self.power_pin) if verify else 0
+        return self.power == 0
 
 
 class BFController(object):
@@ -240,10 +235,10 @@ class BFController(object):
         Create an global status instance, and all eight DOCstatus instances, one for each RxDoC card.
         """
         self.bfs = {}
-        self.power48 = bool(GPIO.input(POWER48))
+        self.power48 = GPIO.input(POWER48)
         self.alarmpower = None
         self.alarm48 = None
-        bus = smbus.SMBus(1)  # Initialise the I2C bus and save the connection object
+        self.bus = bus = SMBus(1)  # Initialise the I2C bus and save the connection object
         for bfnum in range(1, 9):
             ep, pp = BFIOPINS[bfnum]
             self.bfs[bfnum] = RxDoC(bfnum=bfnum,
@@ -251,36 +246,36 @@ class BFController(object):
                                     power_pin=pp,
                                     i2c_address=ADDRESSES[bfnum],
                                     bus=bus)
+        self.bflist = [self.bfs[bfnum] for bfnum in range(1, 9)]  # The same RxDoC instances, in slot order
         self.check()
 
     def check(self):
         """
-        Communicate with the hardware to update current pin states, voltage, and current values.
+        Communicate with the hardware to update the alarm input states, and the voltage and current values for all
+        eight RxDoC cards. The output pin states are not read back, as they're tracked when the pins are written -
+        call resync() on each RxDoC to re-read them.
 
         :return: None
         """
-        self.alarmpower = bool(GPIO.input(ALARMPOWER))
-        self.alarm48 = bool(GPIO.input(ALARM48))
+        self.alarmpower = GPIO.input(ALARMPOWER)
+        self.alarm48 = GPIO.input(ALARM48)
 
         pled = 1  # Box RxDoC power LED, on if all RxDoC's are on
         eled = 1  # Box RxDoC enable LED, on if all RxDoC's are enabled
-        for bfnum in range(1, 9):
-            self.bfs[bfnum].check()
-            if not self.bfs[bfnum].power:
-                pled = 0
-            if not self.bfs[bfnum].enabled:
-                eled = 0
+        for bf in self.bflist:
+            bf.check()
+            pled &= bf.power
+            eled &= bf.enabled
 
         # Turn the box RxDoC power and enable LEDs on or off
-        GPIO.output(DIGOUT1, pled)
-        GPIO.output(DIGOUT2, eled)
+        GPIO.output((DIGOUT1, DIGOUT2), (pled, eled))
 
     def __repr__(self):
-        rets = "EDA Status: 48V=%3s (Alarm=%3s)\n" % (BDICT[self.power48], BDICT[self.alarm48])
-        rets += "  Beamformers:\n"
-        for bfnum in range(1, 9):
-            rets += '    ' + repr(self.bfs[bfnum]) + '\n'
-        return rets
+        lines = ["EDA Status: 48V=%3s (Alarm=%3s)" % (BDICT[self.power48], BDICT[self.alarm48]),
+                 "  Beamformers:"]
+        lines.extend('    ' + repr(bf) for bf in self.bflist)
+        lines.append('')  # End with a newline
+        return '\n'.join(lines)
 
     def turn_on_48(self):
         """
@@ -289,17 +284,18 @@ class BFController(object):
 
         :return: True for success, False on error
         """
-        if True in [x.enabled for x in self.bfs.values()]:
-            for bf in self.bfs.values():
+        if any(x.enabled for x in self.bflist):
+            for bf in self.bflist:
                 bf.disable_bf()
-        if True in [x.power for x in self.bfs.values()]:
-            for bf in self.bfs.values():
+            time.sleep(0.1)  # Wait once, after disabling all of them, before turning off the power to any card
+        if any(x.power for x in self.bflist):
+            for bf in self.bflist:
                 bf.turnoff_doc()
         time.sleep(0.2)
         GPIO.output(POWER48, 1)
         time.sleep(0.1)
-        self.power48 = bool(GPIO.input(POWER48))
-        return (self.power48 is True)
+        self.power48 = GPIO.input(POWER48)
+        return (self.power48 == 1)
 
     def turn_off_48(self):
         """
@@ -308,16 +304,17 @@ class BFController(object):
 
         :return: True for success, False on error
         """
-        if True in [x.enabled for x in self.bfs.values()]:
-            for bf in self.bfs.values():
+        if any(x.enabled for x in self.bflist):
+            for bf in self.bflist:
                 bf.disable_bf()
-        if True in [x.power for x in self.bfs.values()]:
-            for bf in self.bfs.values():
+            time.sleep(0.1)  # Wait once, after disabling all of them, before turning off the power to any card
+        if any(x.power for x in self.bflist):
+            for bf in self.bflist:
                 bf.turnoff_doc()
         GPIO.output(POWER48, 0)
         time.sleep(0.1)
-        self.power48 = bool(GPIO.input(POWER48))
-        return (self.power48 is False)
+        self.power48 = GPIO.input(POWER48)
+        return (self.power48 == 0)
 
     def turnon_all(self):
         """
@@ -329,12 +326,12 @@ class BFController(object):
         time.sleep(0.5)
         powerok = True
         enabled_ok = True
-        for bf in self.bfs.values():
+        # Power up the cards one at a time, rather than all at once, to spread out the inrush current.
+        for bf in self.bflist:
             powerok &= bool(bf.turnon_doc())
             time.sleep(0.1)
             enabled_ok &= bool(bf.enable_bf())
-        GPIO.output(DIGOUT1, powerok)
-        GPIO.output(DIGOUT2, enabled_ok)
+        GPIO.output((DIGOUT1, DIGOUT2), (powerok, enabled_ok))
 
     def turnoff_all(self):
         """
@@ -344,13 +341,16 @@ class BFController(object):
         """
         powerok = True
         enabled_ok = True
-        for bf in self.bfs.values():
+        # Disable all eight beamformers, then wait once before turning off all the RxDoC cards, instead of waiting
+        # separately for each card. Every card is still disabled at least 0.1 seconds before its power goes off.
+        for bf in self.bflist:
             enabled_ok &= bool(bf.disable_bf())
-            time.sleep(0.1)
+        time.sleep(0.1)
+        for bf in self.bflist:
             powerok &= bool(bf.turnoff_doc())
+        time.sleep(0.1)
         self.turn_off_48()
-        GPIO.output(DIGOUT1, not powerok)
-        GPIO.output(DIGOUT2, not enabled_ok)
+        GPIO.output((DIGOUT1, DIGOUT2), (not powerok, not enabled_ok))
 
 
 def init():
@@ -363,16 +363,46 @@ def init():
     global STATUS
     GPIO.setmode(GPIO.BOARD)  # Use board connector pin numbers to specify I/O pins
     GPIO.setwarnings(False)
-    GPIO.setup(POWER48, GPIO.OUT)
-    GPIO.setup(ALARMPOWER, GPIO.IN)
-    GPIO.setup(ALARM48, GPIO.IN)
-    GPIO.setup(DIGOUT1, GPIO.OUT)
-    GPIO.setup(DIGOUT2, GPIO.OUT)
-    GPIO.setup(DIGIN1, GPIO.IN)
-    for i in range(1, 9):
-        enable, power = BFIOPINS[i]
-        GPIO.setup(enable, GPIO.OUT)
-        GPIO.setup(power, GPIO.OUT)
+    # Set up all the pins with the same direction in one call each, rather than one call per pin
+    GPIO.setup([ALARMPOWER, ALARM48, DIGIN1], GPIO.IN)
+    GPIO.setup([POWER48, DIGOUT1, DIGOUT2] + [pin for i in range(1, 9) for pin in BFIOPINS[i]], GPIO.OUT)
+
+
+def alarm_wakeup_fd():
+    """
+    Set up edge detection on the ALARMPOWER and ALARM48 inputs, and return the read end of a pipe that becomes
+    readable whenever either of them changes state, so the main loop can wait on it with select() and check the
+    hardware straight away, instead of up to CHECK_INTERVAL seconds later.
+
+    :return: A file descriptor, or None if edge detection couldn't be set up (the main loop then just sleeps).
+    """
+    rfd, wfd = os.pipe()
+    os.set_blocking(rfd, False)
+    os.set_blocking(wfd, False)
+
+    # noinspection PyUnusedLocal
+    def wakeup(channel):
+        try:
+            os.write(wfd, b'1')
+        except BlockingIOError:
+            pass  # Pipe is full, so there's already a wakeup waiting to be read
+
+    registered = []  # Pins with edge detection set up so far
+    try:
+        for pin in (ALARMPOWER, ALARM48):
+            # The bouncetime stops a chattering alarm line from waking the main loop on every edge.
+            GPIO.add_event_detect(pin, GPIO.BOTH, callback=wakeup, bouncetime=50)
+            registered.append(pin)
+    except RuntimeError:
+        LOGGER.warning("Can't set up edge detection on the alarm inputs, checking every %d seconds", CHECK_INTERVAL)
+        # Remove any callback that was registered before closing the pipe, otherwise it would keep writing to the
+        # closed file descriptor number, which could since have been reused for some other file.
+        for pin in registered:
+            GPIO.remove_event_detect(pin)
+        os.close(rfd)
+        os.close(wfd)
+        return None
+    return rfd
 
 
 def cleanup():
@@ -387,50 +417,9 @@ def cleanup():
     GPIO.cleanup()
 
 
-# noinspection PyUnusedLocal
-def SignalHandler(signum=None, frame=None):
-    """
-    Called when a signal is received thay would result in the programme exit, if the
-    RegisterCleanup() function has been previously called to set the signal handlers and
-    define an exit function using the 'atexit' module.
-
-    Note that exit functions registered by atexit are NOT called when the programme exits due
-    to a received signal, so we must trap signals where possible. The cleanup function will NOT
-    be called when signal 9 (SIGKILL) is received, as this signal cannot be trapped.
-
-    :param signum: Signal number trapped
-    :param frame: Stack frame (unused)
-    :return: None
-    """
-    print("Signal %d received." % signum)
-    sys.exit(-signum)  # Called by signal handler, so exit with a return code indicating the signal received
-
-
-def RegisterCleanup(func):
-    """
-    Traps a number of signals that would result in the program exit, to make sure that the
-    function 'func' is called before exit. The calling process must define its own cleanup
-    function - typically this would delete any facility controller objects, so that any
-    processes they have started will be stopped.
-
-    We don't need to trap signal 2 (SIGINT), because this is internally handled by the python
-    interpreter, generating a KeyboardInterrupt exception - if this causes the process to exit,
-    the function registered by atexit.register() will be called automatically.
-
-    :param func: Function to be called on exit
-    :return: None
-    """
-    global SIGNAL_HANDLERS, CLEANUP_FUNCTION
-    CLEANUP_FUNCTION = func
-    for sig in [3, 15]:
-        SIGNAL_HANDLERS[sig] = signal.signal(sig, SignalHandler)  # Register a signal handler
-    SIGNAL_HANDLERS[1] = signal.signal(1, signal.SIG_IGN)
-    # Register the passed CLEANUP_FUNCTION to be called on
-    # on normal programme exit, with no arguments.
-    atexit.register(CLEANUP_FUNCTION)
-
-
 if __name__ == '__main__':
+    common.setup_logging(LOGFILE, maxbytes=100000000)  # 100 Mb per file
+
     if identify_hardware() != 'POWER':
         LOGGER.critical("I2C device not found - Can't run bfpower.py on a communication Pi.")
         sys.exit(-1)
@@ -438,12 +427,16 @@ if __name__ == '__main__':
     init()  # Set up GPIO pins
 
     BFCON = BFController()
-    RegisterCleanup(cleanup)
+    common.RegisterCleanup(cleanup)
 
     LOGGER.info("Turning on 48V supplies and all eight beamformers")
     BFCON.turnon_all()
 
+    wakefd = alarm_wakeup_fd()
     while True:
         BFCON.check()
-        LOGGER.info(str(BFCON))
-        time.sleep(10)
+        LOGGER.info('%s', BFCON)  # Only formatted if the message is actually logged
+        if wakefd is None:
+            time.sleep(CHECK_INTERVAL)
+        elif select.select([wakefd], [], [], CHECK_INTERVAL)[0]:
+            os.read(wakefd, 4096)  # Woken early by an alarm input changing state, so discard the wakeup bytes
@@ -0,0 +1,112 @@
+"""
+Logging, signal handling and cleanup code shared by the bfpower.py and bfcomms.py scripts.
+"""
+
+import atexit
+import logging
+from logging import handlers
+import os
+import signal
+import sys
+import time
+
+LOGLEVEL_CONSOLE = logging.INFO  # Logging level for console messages (INFO, DEBUG, ERROR, CRITICAL, etc)
+LOGLEVEL_LOGFILE = logging.DEBUG  # Logging level for logfile
+
+SIGNAL_HANDLERS = {}
+CLEANUP_FUNCTION = None
+
+
+class MWALogFormatter(logging.Formatter):
+    # Time (in whole seconds) of the last record formatted, and its timestamp string. Kept as a single tuple, so
+    # that another thread (logging through a different handler) can never see one without the other.
+    last_stamp = (None, '')
+
+    def format(self, record):
+        sec = int(record.created)
+        last_sec, timestamp = self.last_stamp
+        if sec != last_sec:  # Only call strftime() once per second, however many records are logged
+            timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(sec))
+            self.last_stamp = (sec, timestamp)
+        return "%s:%s - %s" % (timestamp,
+                               record.levelname,
+                               record.getMessage())
+
+
+def setup_logging(logfile, maxbytes, console_level=LOGLEVEL_CONSOLE, file_level=LOGLEVEL_LOGFILE):
+    """
+    Send log messages from the root logger to the console, and to the given log file. Called from the __main__ block
+    of each script, so that just importing a module doesn't reconfigure the root logger or create the log file.
+
+    :param logfile: Name of the log file to write
+    :param maxbytes: Maximum size of the log file before it's rotated - up to five old log files are kept
+    :param console_level: Logging level for console messages (INFO, DEBUG, ERROR, CRITICAL, etc)
+    :param file_level: Logging level for the log file
+    :return: The root logging.Logger() instance
+    """
+    mwalf = MWALogFormatter()
+
+    logger = logging.getLogger()
+    logger.setLevel(logging.DEBUG)
+    logger.handlers = []
+    logger.propagate = False
+
+    fh = handlers.RotatingFileHandler(logfile,
+                                      maxBytes=maxbytes,
+                                      backupCount=5)
+    fh.setLevel(file_level)
+    fh.setFormatter(mwalf)
+
+    ch = logging.StreamHandler()
+    ch.setLevel(console_level)
+    ch.setFormatter(mwalf)
+
+    # add the handlers to the logger
+    logger.addHandler(fh)
+    logger.addHandler(ch)
+    return logger
+
+
+# noinspection PyUnusedLocal
+def SignalHandler(signum=None, frame=None):
+    """
+    Called when a signal is received that would result in the programme exit, if the
+    RegisterCleanup() function has been previously called to set the signal handlers and
+    define an exit function using the 'atexit' module.
+
+    Note that exit functions registered by atexit are NOT called when the programme exits due
+    to a received signal, so we must trap signals where possible. The cleanup function will NOT
+    be called when signal 9 (SIGKILL) is received, as this signal cannot be trapped.
+
+    :param signum: Signal number trapped
+    :param frame: Stack frame (unused)
+    :return: None
+    """
+    # os.write() is safe to call here - print() or logging could block, or re-enter a lock that was held
+    # when the signal arrived.
+    os.write(2, b"Signal %d received.\n" % signum)
+    sys.exit(-signum)  # Called by signal handler, so exit with a return code indicating the signal received
+
+
+def RegisterCleanup(func):
+    """
+    Traps a number of signals that would result in the program exit, to make sure that the
+    function 'func' is called before exit. The calling process must define its own cleanup
+    function - typically this would delete any facility controller objects, so that any
+    processes they have started will be stopped.
+
+    We don't need to trap SIGINT, because this is internally handled by the python
+    interpreter, generating a KeyboardInterrupt exception - if this causes the process to exit,
+    the function registered by atexit.register() will be called automatically.
+
+    :param func: Function to be called on exit
+    :return: None
+    """
+    global SIGNAL_HANDLERS, CLEANUP_FUNCTION
+    CLEANUP_FUNCTION = func
+    for sig in (signal.SIGQUIT, signal.SIGTERM):
+        SIGNAL_HANDLERS[sig] = signal.signal(sig, SignalHandler)  # Register a signal handler
+    SIGNAL_HANDLERS[signal.SIGHUP] = signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    # Register the passed CLEANUP_FUNCTION to be called on
+    # on normal programme exit, with no arguments.
+    atexit.register(CLEANUP_FUNCTION)
@@ -7,6 +7,9 @@ Written by Andrew Williams (Andrew.Williams@curtin.edu.au)
 
 """
 
+import atexit
+import contextlib
+import fcntl
 import logging
 import threading
 import time
@@ -14,7 +17,9 @@ import time
 # noinspection PyUnresolvedReferences
 import RPi.GPIO as GPIO
 # noinspection PyUnresolvedReferences
-import smbus
+from smbus2 import SMBus, i2c_msg
+
+from mwabf import fastgpio
 
 logging.basicConfig()
 
@@ -32,12 +37,31 @@ AUXOFF = 22  # VauxPowerOff - 'high' to turn OFF power supply running media conv
 SERIALMODE = 23  # RS485/RS232_L - 'high' for RS485, 'low' for RS232
 SERENABLE = 24  # SerialCommsOn - 'high' to ENABLE power to the serial comms IC
 
+ACTIVE_LOW_PINS = (RFOFOFF, AUXOFF)  # Output pins that turn things OFF when they're high
+
 # I2C device addresses for the i2c sensors on the BFIF board. Note that these are _seven_ bit addresses,
 # so 0x68 in seven bits corresponds to D0 when the r/w bit is appended as bit 0 of the address, and
 # 0x48 corresponds to 0x90.
 ADDRESS7_LTC4151 = 0x68
 ADDRESS7_DS75 = 0x48
 
+# Bit flags for BFIFHandler._sensor_errors, set while that sensor can't be read
+ERR_LTC4151 = 1
+ERR_DS75 = 2
+
+DS75_CONFIG = 96  # DS75 configuration register value, for 12 bit temperature resolution
+
+CURRENT_SCALE = 20e-6 / 0.02  # LTC4151 current, in Amps per ADU - 20uV per ADU, through a 0.02 Ohm shunt
+VOLTAGE_SCALE = 0.025  # LTC4151 voltage, in Volts per ADU - 25mV per ADU
+
+DOC_SETTLE_TIME = 0.5  # Seconds to wait after turning on the RxDoC card, before enabling the beamformer.
+
+GPIO_READY = False  # True once setup_gpio() has configured the pins, until cleanup_gpio() releases them
+GPIOMEM = None  # Mapped GPIO registers (see mwabf.fastgpio) if setup_gpio() found them, otherwise None to use RPi.GPIO
+
+BUS = None  # Shared smbus2.SMBus instance for the Raspberry Pi's I2C bus, opened on first use by get_bus()
+BUS_LOCK = threading.Lock()  # Held by get_bus() while opening BUS, and by _bus_flock() around each transaction
+
 
 ##################################################################################
 #
@@ -48,22 +72,21 @@ ADDRESS7_DS75 = 0x48
 
 def setup_gpio():
     """
-        Setup GPIO pin configuration as required.
+        Setup GPIO pin configuration as required. Called by BFIFHandler.__init__(), and does nothing if the pins
+        have already been set up.
 
         :return: None
     """
+    global GPIO_READY, GPIOMEM
+    if GPIO_READY:
+        return
+    GPIOMEM = fastgpio.get_gpiomem()  # Decide once whether pin writes and reads go through the registers or RPi.GPIO
     GPIO.setmode(GPIO.BOARD)  # Use board connector pin numbers to specify I/O pins
     GPIO.setwarnings(False)
-    GPIO.setup(DOCPOWER, GPIO.OUT)
-    GPIO.setup(BFENABLE, GPIO.OUT)
-    GPIO.setup(TXDATA, GPIO.OUT)
-    GPIO.setup(TXCLOCK, GPIO.OUT)
-    GPIO.setup(RXDATA, GPIO.IN)
-    GPIO.setup(OPMODE, GPIO.IN)
-    GPIO.setup(RFOFOFF, GPIO.OUT)
-    GPIO.setup(AUXOFF, GPIO.OUT)
-    GPIO.setup(SERIALMODE, GPIO.OUT)
-    GPIO.setup(SERENABLE, GPIO.OUT)
+    # Set up all the pins with the same direction in one call each, rather than one call per pin
+    GPIO.setup([DOCPOWER, BFENABLE, TXDATA, TXCLOCK, RFOFOFF, AUXOFF, SERIALMODE, SERENABLE], GPIO.OUT)
+    GPIO.setup([RXDATA, OPMODE], GPIO.IN)
+    GPIO_READY = True
 
 
 def cleanup_gpio():
@@ -76,7 +99,87 @@ def cleanup_gpio():
 
         :return: None
     """
+    global GPIO_READY
     GPIO.cleanup()
+    GPIO_READY = False
+
+
+def _output(pin, value):
+    """
+    Set an output pin high or low, writing directly to the GPIO registers if setup_gpio() mapped them (see
+    mwabf.fastgpio), otherwise using RPi.GPIO.
+
+    :param pin: Raspberry Pi header (GPIO.BOARD) pin number
+    :param value: 1 (or True) for high, 0 (or False) for low
+    :return: None
+    """
+    if GPIOMEM is None:
+        GPIO.output(pin, value)
+    elif value:
+        fastgpio.set_high(pin)
+    else:
+        fastgpio.set_low(pin)
+
+
+def _input(pin):
+    """
+    Return the current level of a pin (0 or 1), read directly from the GPIO registers if setup_gpio() mapped them
+    (see mwabf.fastgpio), otherwise using RPi.GPIO.
+
+    :param pin: Raspberry Pi header (GPIO.BOARD) pin number
+    :return: 0 or 1
+    """
+    if GPIOMEM is None:
+        return GPIO.input(pin)
+    return fastgpio.read(pin)
+
+
+def get_bus():
+    """
+    Return the smbus2.SMBus instance for I2C bus 1, opening it the first time this is called, so that every
+    BFIFHandler shares the same file descriptor. It's closed on program exit.
+
+    :return: smbus2.SMBus instance
+    """
+    global BUS
+    with BUS_LOCK:
+        if BUS is None:
+            BUS = SMBus(1)
+            atexit.register(BUS.close)
+        return BUS
+
+
+@contextlib.contextmanager
+def _bus_flock(bus):
+    """
+    Hold the bus for the duration of a 'with' block. BUS_LOCK serialises transactions from all the BFIFHandlers
+    in this process (self.lock only covers one handler). The exclusive advisory lock (flock) on the I2C bus device
+    only helps against other processes on this Pi that talk to the same sensors, as long as they lock the device
+    the same way - every handler here shares the one file descriptor from get_bus(), and flock locks belong to the
+    open file, so it can't serialise them against each other.
+
+    :param bus: smbus2.SMBus instance
+    """
+    with BUS_LOCK:
+        fcntl.flock(bus.fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(bus.fd, fcntl.LOCK_UN)
+
+
+def _sleep_until(t):
+    """
+    Sleep until time.monotonic() reaches t (returning immediately if it already has). Used to schedule a series of
+    steps relative to a fixed start time, so that delays in each step don't accumulate.
+
+    :param t: Target time, in seconds, on the time.monotonic() clock.
+    :return: t, so the caller can use it as the base for the next step.
+    """
+    delay = t - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+    return t
 
 ##################################################################################
 #
@@ -92,41 +195,75 @@ class BFIFHandler(object):
     switching 48V to the beamformer, and switching power to the RF-on-Fibre (RFoF) modules (if present).
     """
 
-    def __init__(self, logger=logging):
+    _BDICT = {False:'OFF', True:'ON', None:'ERROR!'}  # Used by __repr__() to display the hardware state flags
+
+    # Fixed set of instance attributes, so instances don't need a __dict__
+    __slots__ = ('logger', 'opmode_callback', 'opmode_events', 'lock', 'bus', 'ltc4151_msgs', 'ds75_msgs',
+                 'current', 'voltage', 'temp', 'serialmode', 'docpower', 'bfenabled', 'opmode', 'rfof',
+                 'auxpower', 'serialpower', '_status', '_last_check', '_last_check_ok', '_check_ttl',
+                 '_sensor_errors')
+
+    def __init__(self, logger=logging, opmode_callback=None):
         """
         Create a BFIFHandler instance.
 
         :param logger: Optional logging.Logger() instance.
+        :param opmode_callback: Optional function, called with the new state (True or False) whenever the
+                                OPMODE jumper changes.
         """
         self.logger = logger
-        self.lock = threading.RLock()  # Used to control access to the hardware resources (i2C, GPIO) on the BFIF board
-        with self.lock:
-            self.logger.debug('BFIFHandler - Initialising BFIFHandler()')
-            self.bus = smbus.SMBus(1)  # Initialise the i2c bus on the Raspberry Pi.
-            self.current = 0.0
-            self.voltage = 0.0
-            self.temp = 0.0
-            self.serialmode = ''  # Either 'RS232' or 'RS485'
-
-            # Booleans for hardware state. True for 'ON', False for 'OFF', None if there was an error on the last state change:
-            self.docpower = bool(GPIO.input(DOCPOWER))  # True if the RxDoC card is powered up.
-            self.bfenabled = bool(GPIO.input(BFENABLE))  # True if the enable bit is set on the RxDoC, powering up the beamformer.
-            self.opmode = bool(GPIO.input(OPMODE))  # Input, hardware link status, defaults to False. Move jumper to 'True' to shut down Pi cleanly.
-            self.rfof = not bool(GPIO.input(RFOFOFF))  # True if the power is on to the RFoF modules.
-            self.auxpower = not bool(GPIO.input(AUXOFF))  # True if the 9V auxillary power supply is turned on.
-            self.serialpower = bool(GPIO.input(SERENABLE))  # True if the MAX232 serial chip is powered up.
-
-            try:
-                self.bus.write_i2c_block_data(ADDRESS7_DS75, 1, [96])  # Set 12 bit temperature resolution
-            except:
-                logger.warning('BFIFHandler - could not set 12-bit resolution temperature measurement mode')
-            time.sleep(0.1)
-
-            # Set up initial hardware state on boot:
-            self.disable_bf()  # Leave the beamformer turned off.
-            self.turnoff_doc()  # Leave the RxDoC turned off.
-            self.turnoff_rfof()  # Leave the RFoF modules turned off.
-            self.check()  # Read initial voltages, currents and temperatures.
+        self.opmode_callback = opmode_callback
+        self.lock = threading.Lock()  # Used to control access to the hardware resources (i2C, GPIO) on the BFIF board
+        self.logger.debug('BFIFHandler - Initialising BFIFHandler()')
+        setup_gpio()  # Make sure the pins are set up before they're read below
+        self.bus = get_bus()  # The i2c bus on the Raspberry Pi, shared with any other BFIFHandler instances.
+        # Pre-built (set register pointer, read data) message pairs for the two sensors, used by check().
+        self.ltc4151_msgs = (i2c_msg.write(ADDRESS7_LTC4151, [0]), i2c_msg.read(ADDRESS7_LTC4151, 4))
+        self.ds75_msgs = (i2c_msg.write(ADDRESS7_DS75, [0]), i2c_msg.read(ADDRESS7_DS75, 2))
+        self.current = 0.0
+        self.voltage = 0.0
+        self.temp = 0.0
+        self.serialmode = ''  # Either 'RS232' or 'RS485'
+        self._last_check = 0.0  # time.monotonic() value when the sensors were last read by check()
+        self._last_check_ok = True  # Return value from the last full check()
+        self._check_ttl = 0.5  # Seconds that a call to check() will re-use the last sensor readings for
+        self._sensor_errors = 0  # ERR_LTC4151 and/or ERR_DS75 flags, for the sensors that failed on the last check()
+
+        # Booleans for hardware state. True for 'ON', False for 'OFF', None if there was an error on the last state change:
+        self.docpower = bool(_input(DOCPOWER))  # True if the RxDoC card is powered up.
+        self.bfenabled = bool(_input(BFENABLE))  # True if the enable bit is set on the RxDoC, powering up the beamformer.
+        self.opmode = bool(_input(OPMODE))  # Input, hardware link status, defaults to False. Move jumper to 'True' to shut down Pi cleanly.
+        self.rfof = not bool(_input(RFOFOFF))  # True if the power is on to the RFoF modules.
+        self.auxpower = not bool(_input(AUXOFF))  # True if the 9V auxillary power supply is turned on.
+        self.serialpower = bool(_input(SERENABLE))  # True if the MAX232 serial chip is powered up.
+        self._update_status()
+
+        # Update self.opmode from an edge interrupt on the OPMODE pin, instead of polling it in check(). If
+        # edge detection is already in use on that pin (eg, by another BFIFHandler), fall back to polling.
+        try:
+            GPIO.add_event_detect(OPMODE, GPIO.BOTH, callback=self._opmode_changed, bouncetime=50)
+            self.opmode_events = True
+        except RuntimeError:
+            self.logger.warning('BFIFHandler - could not set up edge detection on OPMODE pin, polling instead')
+            self.opmode_events = False
+
+        ds75_ready = time.monotonic()
+        try:
+            with _bus_flock(self.bus):
+                # The DS75 keeps its configuration until it's powered off, so it only needs setting (and time to
+                # settle) the first time after power-up, not every time a BFIFHandler is created.
+                if self.bus.read_byte_data(ADDRESS7_DS75, 1) != DS75_CONFIG:
+                    self.bus.write_i2c_block_data(ADDRESS7_DS75, 1, [DS75_CONFIG])  # Set 12 bit temperature resolution
+                    ds75_ready += 0.1  # Give the DS75 time to start converting at the new resolution
+        except:
+            logger.warning('BFIFHandler - could not set 12-bit resolution temperature measurement mode')
+
+        # Set up initial hardware state on boot, while the DS75 settles:
+        self.disable_bf()  # Leave the beamformer turned off.
+        self.turnoff_doc()  # Leave the RxDoC turned off.
+        self.turnoff_rfof()  # Leave the RFoF modules turned off.
+        _sleep_until(ds75_ready)
+        self.check(force=True)  # Read initial voltages, currents and temperatures.
 
     def get_status(self):
         """
@@ -138,87 +275,137 @@ class BFIFHandler(object):
 
         :return: dictionary containing status data.
         """
+        return dict(self._status)
+
+    def _update_status(self):
+        """
+        Rebuild the status dict returned by get_status(). Called after every change to the hardware state,
+        with self.lock held.
+
+        The new dict is never modified after it's assigned to self._status, and assigning an attribute is atomic,
+        so get_status() can copy it without acquiring the lock.
+
+        :return: None
+        """
+        self._status = {'current':self.current,
+                        'voltage':self.voltage,
+                        'temp':self.temp,
+                        'docpower':self.docpower,
+                        'bfpower':self.bfenabled,
+                        'opmode':self.opmode,
+                        'rfof':self.rfof,
+                        'auxpower':self.auxpower,
+                        'serialpower':self.serialpower,
+                        'serialmode':self.serialmode}
+
+    def _set_pin_locked(self, pin, level, attr, verify=False):
+        """
+        Drive an output pin high or low, and record the resulting hardware state (True for 'ON') in the given
+        attribute. Pins in ACTIVE_LOW_PINS turn things ON when they're low. Must be called with self.lock held.
+
+        :param pin: Raspberry Pi header (GPIO.BOARD) pin number
+        :param level: 1 to drive the pin high, 0 to drive it low
+        :param attr: Name of the attribute that holds the state controlled by this pin, eg 'docpower'
+        :param verify: If True, read back the pin state to confirm the change, instead of trusting the value written.
+        :return: boolean, True for success, False for failure
+        """
+        _output(pin, level)
+        active_low = pin in ACTIVE_LOW_PINS
+        wanted = bool(level) != active_low
+        state = (bool(_input(pin)) != active_low) if verify else wanted
+        setattr(self, attr, state)
+        self._update_status()
+        return state is wanted
+
+    def _opmode_changed(self, channel):
+        """
+        Called by RPi.GPIO, in its own thread, when there's an edge on the OPMODE pin. Updates self.opmode, and
+        calls the user's opmode_callback function, if one was given.
+
+        :param channel: GPIO pin number that changed (always OPMODE)
+        :return: None
+        """
         with self.lock:
-            status = {'current':self.current,
-                      'voltage':self.voltage,
-                      'temp':self.temp,
-                      'docpower':self.docpower,
-                      'bfpower':self.bfenabled,
-                      'opmode':self.opmode,
-                      'rfof':self.rfof,
-                      'auxpower':self.auxpower,
-                      'serialpower':self.serialpower,
-                      'serialmode':self.serialmode}
-        return status
-
-    def enable_bf(self):
+            self.opmode = bool(_input(channel))
+            self._update_status()
+        self.logger.info('BFIFHandler - OPMODE jumper changed to %s', self.opmode)
+        if self.opmode_callback is not None:
+            self.opmode_callback(self.opmode)
+
+    def enable_bf(self, verify=False):
         """
         Turn on the output power enable FET on the RxDoC card. This must be called _after_ powering up the DoC card.
 
         Return True if there were no errors, False if there was an error, None if the DoC card was off when called.
 
+        :param verify: If True, read back the pin state to confirm the change, instead of trusting the value written.
         :return: boolean, True for success, False for failure
         """
         if not self.docpower:
             self.logger.error("BFIFHandler - must turn on power to the doc before enabling it")
             return None
+        self.logger.debug('BFIFHandler - Turning ON 48V to beamformer')
         with self.lock:
-            self.logger.debug('BFIFHandler - Turning ON 48V to beamformer')
-            GPIO.output(BFENABLE, 1)
-            self.bfenabled = bool(GPIO.input(BFENABLE))
-        return self.bfenabled is True
+            return self._set_pin_locked(BFENABLE, 1, 'bfenabled', verify=verify)
 
-    def disable_bf(self):
+    def disable_bf(self, verify=False):
         """
         Turn off the output power enable FET on the RxDoC card.
 
         Return True if there were no errors, False if there was an error.
 
+        :param verify: If True, read back the pin state to confirm the change, instead of trusting the value written.
         :return: boolean, True for success, False for failure
         """
+        self.logger.debug('BFIFHandler - Turning OFF 48V to beamformer')
         with self.lock:
-            self.logger.debug('BFIFHandler - Turning OFF 48V to beamformer')
-            GPIO.output(BFENABLE, 0)
-            self.bfenabled = bool(GPIO.input(BFENABLE))
-        return self.bfenabled is False
+            return self._set_pin_locked(BFENABLE, 0, 'bfenabled', verify=verify)
 
-    def turnon_doc(self):
+    def turnon_doc(self, verify=False):
         """
         Switch the power on to the RxDoC card, using the FET on the BFIF board. If the beamformer is enabled
         when this method is called, it will be automatically disabled before power is turned on.
 
         Return True if there were no errors, False if there was an error.
 
+        :param verify: If True, read back the pin state to confirm the change, instead of trusting the value written.
         :return: boolean, True for success, False for failure
         """
+        self.logger.debug('BFIFHandler - Turning ON 48V to DoC card')
         with self.lock:
-            if self.bfenabled:
-                self.disable_bf()  # If the DoC card is enabled, disable it BEFORE turning the power on.
-                time.sleep(0.1)
-            self.logger.debug('BFIFHandler - Turning ON 48V to DoC card')
-            GPIO.output(DOCPOWER, 1)
-            self.docpower = bool(GPIO.input(DOCPOWER))
-        return self.docpower is True
+            return self._turnon_doc_locked(verify=verify)
 
-    def turnoff_doc(self):
+    def _turnon_doc_locked(self, verify=False):
+        """
+        Disable the beamformer if necessary, then set the DOCPOWER pin, and update the hardware state. Must be
+        called with self.lock held.
+
+        :param verify: If True, read back the pin state to confirm the change, instead of trusting the value written.
+        :return: boolean, True for success, False for failure
+        """
+        if self.bfenabled:  # If the DoC card is enabled, disable it BEFORE turning the power on.
+            self._set_pin_locked(BFENABLE, 0, 'bfenabled')
+            time.sleep(0.1)
+        return self._set_pin_locked(DOCPOWER, 1, 'docpower', verify=verify)
+
+    def turnoff_doc(self, verify=False):
         """
         Switch the power off to the RxDoC card, using the FET on the BFIF board. If the beamformer is enabled
         when this method is called, it will be automatically disabled before power is turned off.
 
         Return True if there were no errors, False if there was an error.
 
+        :param verify: If True, read back the pin state to confirm the change, instead of trusting the value written.
         :return: boolean, True for success, False for failure
         """
+        self.logger.debug('BFIFHandler - Turning OFF 48V to DoC card')
         with self.lock:
             if self.bfenabled:
-                self.disable_bf()
+                self._set_pin_locked(BFENABLE, 0, 'bfenabled')
                 time.sleep(0.1)
-            self.logger.debug('BFIFHandler - Turning OFF 48V to DoC card')
-            GPIO.output(DOCPOWER, 0)
-            self.docpower = bool(GPIO.input(DOCPOWER))
-        return self.docpower is False
+            return self._set_pin_locked(DOCPOWER, 0, 'docpower', verify=verify)
 
-    def turnon_aux(self):
+    def turnon_aux(self, verify=False):
         """
         Turn on the Auxillary power supply, which provides power to the network media converter (if present).
         If this power supply is off, no network activity is possible unless directly connected to the Raspberry
@@ -226,239 +413,262 @@ class BFIFHandler(object):
 
         Return True if there were no errors, False if there was an error.
 
+        :param verify: If True, read back the pin state to confirm the change, instead of trusting the value written.
         :return: boolean, True for success, False for failure
         """
+        self.logger.debug('BFIFHandler - Turning ON power to fibre/copper media converter')
         with self.lock:
-            self.logger.debug('BFIFHandler - Turning ON power to fibre/copper media converter')
-            GPIO.output(AUXOFF, 0)
-            self.auxpower = not bool(GPIO.input(AUXOFF))
-        return self.auxpower is True
+            return self._set_pin_locked(AUXOFF, 0, 'auxpower', verify=verify)
 
-    def turnoff_aux(self):
+    def turnoff_aux(self, verify=False):
         """
         Turn off the Auxillary power suppply, which provides power to the network media converter (if present).
         If this power supply is off, no network activity is possible.
 
         Return True if there were no errors, False if there was an error.
 
+        :param verify: If True, read back the pin state to confirm the change, instead of trusting the value written.
         :return: boolean, True for success, False for failure
         """
+        self.logger.debug('BFIFHandler - Turning OFF power to fibre/copper media converter')
         with self.lock:
-            self.logger.debug('BFIFHandler - Turning OFF power to fibre/copper media converter')
-            GPIO.output(AUXOFF, 1)
-            self.auxpower = not bool(GPIO.input(AUXOFF))
-        return self.auxpower is False
+            return self._set_pin_locked(AUXOFF, 1, 'auxpower', verify=verify)
 
-    def turnon_rfof(self):
+    def turnon_rfof(self, verify=False):
         """
         Turn on power to the 'RF over Fibre' modules, if present.
 
         Return True if there were no errors, False if there was an error.
 
+        :param verify: If True, read back the pin state to confirm the change, instead of trusting the value written.
         :return: boolean, True for success, False for failure
         """
+        self.logger.debug('BFIFHandler - Turning ON power to RFoF modules')
         with self.lock:
-            self.logger.debug('BFIFHandler - Turning ON power to RFoF modules')
-            GPIO.output(RFOFOFF, 0)
-            self.rfof = not bool(GPIO.input(RFOFOFF))
-        return self.rfof is True
+            return self._set_pin_locked(RFOFOFF, 0, 'rfof', verify=verify)
 
-    def turnoff_rfof(self):
+    def turnoff_rfof(self, verify=False):
         """
         Turn off power to the 'RF over Fibre' modules, if present.
 
         Return True if there were no errors, False if there was an error.
 
+        :param verify: If True, read back the pin state to confirm the change, instead of trusting the value written.
         :return: boolean, True for success, False for failure
         """
+        self.logger.debug('BFIFHandler - Turning OFF power to RFoF modules')
         with self.lock:
-            self.logger.debug('BFIFHandler - Turning OFF power to RFoF modules')
-            GPIO.output(RFOFOFF, 1)
-            self.rfof = not bool(GPIO.input(RFOFOFF))
-        return self.rfof is False
+            return self._set_pin_locked(RFOFOFF, 1, 'rfof', verify=verify)
 
-    def turnon_serial(self):
+    def turnon_serial(self, verify=False):
         """
         Turn on power to the serial comms chip that allows communication with external devices.
         If this power is turned off, no serial communication is possible.
 
         Return True if there were no errors, False if there was an error.
 
+        :param verify: If True, read back the pin state to confirm the change, instead of trusting the value written.
         :return: boolean, True for success, False for failure
         """
+        self.logger.debug('BFIFHandler - Turning ON power to serial chip')
         with self.lock:
-            self.logger.debug('BFIFHandler - Turning ON power to serial chip')
-            GPIO.output(SERENABLE, 1)
-            self.serialpower = bool(GPIO.input(SERENABLE))
-        return self.serialpower is True
+            return self._set_pin_locked(SERENABLE, 1, 'serialpower', verify=verify)
 
-    def turnoff_serial(self):
+    def turnoff_serial(self, verify=False):
         """
         Turn off power to the serial comms chip that allows communication with external devices.
         If this power is turned off, no serial communication is possible.
 
         Return True if there were no errors, False if there was an error.
 
+        :param verify: If True, read back the pin state to confirm the change, instead of trusting the value written.
         :return: boolean, True for success, False for failure
         """
+        self.logger.debug('BFIFHandler - Turning OFF power to serial chip')
         with self.lock:
-            self.logger.debug('BFIFHandler - Turning OFF power to serial chip')
-            GPIO.output(SERENABLE, 0)
-            self.serialpower = bool(GPIO.input(SERENABLE))
-        return self.serialpower is False
+            return self._set_pin_locked(SERENABLE, 0, 'serialpower', verify=verify)
 
-    def setrs232(self):
+    def setrs232(self, verify=False):
         """
         Configure the serial comms link to the SPIU as RS232.
 
         Return True if there were no errors, False if there was an error.
 
+        :param verify: If True, read back the pin state to confirm the change, instead of trusting the value written.
         :return: boolean, True for success, False for failure
         """
+        self.logger.debug('BFIFHandler - Set serial mode to RS232')
         with self.lock:
-            self.logger.debug('BFIFHandler - Set serial mode to RS232')
-            GPIO.output(SERIALMODE, 0)
+            _output(SERIALMODE, 0)
             self.serialmode = 'RS232'
-        return not bool(GPIO.input(SERIALMODE))
+            self._update_status()
+        return (not bool(_input(SERIALMODE))) if verify else True
 
-    def setrs485(self):
+    def setrs485(self, verify=False):
         """
         Configure the serial comms link to the SPIU as RS485
 
         Return True if there were no errors, False if there was an error.
 
+        :param verify: If True, read back the pin state to confirm the change, instead of trusting the value written.
         :return: boolean, True for success, False for failure
         """
+        self.logger.debug('BFIFHandler - Set serial mode to RS485')
         with self.lock:
-            self.logger.debug('BFIFHandler - Set serial mode to RS485')
-            GPIO.output(SERIALMODE, 1)
+            _output(SERIALMODE, 1)
             self.serialmode = 'RS485'
-        return bool(GPIO.input(SERIALMODE))
+            self._update_status()
+        return bool(_input(SERIALMODE)) if verify else True
 
-    def check(self):
+    def check(self, force=False):
         """
         Read local (BFIF) temperature, and voltage and current to the RxDoC card, from the I2C sensors on the,
         and update the local sensor values.
 
-        Also read the state of the local 'OPMODE' jumper setting.
+        Also read the state of the local 'OPMODE' jumper setting, if it isn't being updated by edge detection.
+
+        If the sensors were last read less than self._check_ttl seconds ago, the I2C reads are skipped and the
+        previous values (and return value) are re-used, unless force is True.
+
+        Return True if there were no errors, False if there was an error.
+
+        :param force: If True, always read the sensors, even if the last readings are still fresh.
+        :return: boolean, True for success, False for failure
+        """
+        if not force and (time.monotonic() - self._last_check) < self._check_ttl:
+            return self._last_check_ok
+        if not self.opmode_events:
+            self._read_opmode()
+        return self._read_sensors()
+
+    def _read_opmode(self):
+        """
+        Read the state of the local 'OPMODE' jumper setting, and update self.opmode. Only needed if self.opmode
+        isn't being updated by edge detection on the OPMODE pin.
+
+        :return: None
+        """
+        with self.lock:
+            self.opmode = bool(_input(OPMODE))  # Input, hardware link status, defaults to False. Move jumper to 'True' to shut down Pi cleanly.
+            self._update_status()
+
+    def _read_sensors(self):
+        """
+        Read the LTC4151 and DS75 sensors on the BFIF board, and update the current, voltage and temperature
+        values. Called by check().
 
         Return True if there were no errors, False if there was an error.
 
         :return: boolean, True for success, False for failure
         """
-        self.opmode = bool(GPIO.input(OPMODE))  # Input, hardware link status, defaults to False. Move jumper to 'True' to shut down Pi cleanly.
-        ok = True
+        errors = 0
         with self.lock:
             # Read voltage and current from the LTC4151:
             try:
-                data = self.bus.read_i2c_block_data(ADDRESS7_LTC4151, 0, 4)
-                self.current = ((data[0] * 16) + (
-                            data[1] / 16)) * 20e-6 / 0.02  # 20uV per ADU, through a 0.02 Ohm shunt
-                self.voltage = ((data[2] * 16) + (data[3] / 16)) * 0.025  # 25mV per ADU
+                with _bus_flock(self.bus):
+                    self.bus.i2c_rdwr(*self.ltc4151_msgs)
+                data = bytes(self.ltc4151_msgs[1])
+                # Each 12-bit value is sent MSB first, as 8 bits then the top nibble of the next byte.
+                self.current = ((data[0] << 4) | (data[1] >> 4)) * CURRENT_SCALE
+                self.voltage = ((data[2] << 4) | (data[3] >> 4)) * VOLTAGE_SCALE
             except IOError:
-                self.logger.error("BFIFHandler - Can't read LTC4151 sensor on BFIF board")
-                ok = False
+                if not self._sensor_errors & ERR_LTC4151:  # Only log the first failure, not every check() after that
+                    self.logger.error("BFIFHandler - Can't read LTC4151 sensor on BFIF board")
+                errors |= ERR_LTC4151
                 self.current = -999.0
                 self.voltage = -999.0
 
             # Read temperature from the DS75
             try:
-                data = self.bus.read_i2c_block_data(0x48, 0, 2)
+                with _bus_flock(self.bus):
+                    self.bus.i2c_rdwr(*self.ds75_msgs)
+                data = list(self.ds75_msgs[1])
                 self.temp = data[0] + data[1] / 256.0
             except IOError:
-                self.logger.error("BFIFHandler - Can't read DS75 sensor on BFIF board")
-                ok = False
+                if not self._sensor_errors & ERR_DS75:
+                    self.logger.error("BFIFHandler - Can't read DS75 sensor on BFIF board")
+                errors |= ERR_DS75
                 self.temp = -999.0
+            if self._sensor_errors & ~errors:
+                self.logger.info("BFIFHandler - I2C sensor comms on BFIF board recovered")
+            self._sensor_errors = errors
+            ok = not errors
+            self._last_check = time.monotonic()
+            self._last_check_ok = ok
+            self._update_status()
         return ok
 
     def testboard(self):
         """
         Low-level board test, used to do lab testing of a bare BFIF board before assembly.
 
-        NEVER exits, runs tests continuously. Does not need a Beamformer connected.
-        """
+        NEVER exits, runs tests continuously. Does not need a Beamformer connected. Each pin change is read
+        back to verify it.
+
+        Each step is scheduled one second after the previous one, relative to a fixed start time, so the test
+        cadence doesn't drift.
+        """
+        # (method, description) for each test step, in the order they're run
+        power_on = ((self.turnon_aux, 'AUX power on'),  # Power to the fibre media converter for network access.
+                    (self.turnon_serial, 'Serial power on'),  # Power to the serial comms to the BL233 chip for the SPIUHandler().
+                    (self.turnon_doc, 'RxDoC power on'),  # Power to the RxDoC.
+                    (self.enable_bf, 'RxDoc enable beamformer signal'),  # Enable Beamformer signal to the RxDoc.
+                    (self.turnon_rfof, 'RFoF power on'))  # Power to the RFoF modules.
+        power_off = ((self.turnoff_rfof, 'RFoF power off'),
+                     (self.disable_bf, 'RxDoc disable beamformer signal'),
+                     (self.turnoff_doc, 'RxDoC power off'),
+                     (self.turnoff_serial, 'Serial power off'),
+                     (self.turnoff_aux, 'AUX power off'))
+
+        next_t = time.monotonic()
         while True:
-            if not self.turnon_aux():  # Power to the fibre media converter for network access.
-                self.logger.critical('AUX power on FAILED')
-            else:
-                self.logger.info('AUX power on PASSED')
-
-            time.sleep(1)
-
-            if not self.turnon_serial():  # Power to the serial comms to the BL233 chip for the SPIUHandler().
-                self.logger.critical('Serial power on FAILED')
-            else:
-                self.logger.info('Serial power on PASSED')
-
-            time.sleep(1)
-
-            if not self.turnon_doc():  # Power to the RxDoC.
-                self.logger.critical('RxDoC power on FAILED')
-            else:
-                self.logger.info('RxDoC power on PASSED')
-
-            time.sleep(1)
+            for method, desc in power_on:
+                if not method(verify=True):
+                    self.logger.critical('%s FAILED', desc)
+                else:
+                    self.logger.info('%s PASSED', desc)
+                next_t = _sleep_until(next_t + 1)
 
-            if not self.enable_bf():  # Enable Beamformer signal to the RxDoc.
-                self.logger.critical('RxDoc enable beamformer signal FAILED')
-            else:
-                self.logger.info('RxDoc enable beamformer signal PASSED')
-
-            time.sleep(1)
-
-            if not self.turnon_rfof():  # Power to the RFoF modules.
-                self.logger.critical('RFoF power on FAILED')
-            else:
-                self.logger.info('RFoF power on PASSED')
+            next_t = _sleep_until(next_t + 1)
 
-            time.sleep(1)
-
-            time.sleep(1)
-
-            ok = self.check()
+            ok = self.check(force=True)
             if not ok:
                 self.logger.critical('I2C test FAILED, bad comms to devices')
             else:
-                self.logger.info('I2C test PASSED: voltage=%5.2f V, current=%4.0f mA, temp=%4.1f C' % (self.voltage, self.current * 1000, self.temp))
-
-            self.logger.info('State of OPMODE jumper is %s' % self.opmode)  # Pin is tested by check() method.
-
-            time.sleep(1)
-
-            if not self.turnoff_rfof():  # Power to the RFoF modules.
-                self.logger.critical('RFoF power off FAILED')
-            else:
-                self.logger.info('RFoF power off PASSED')
-
-            time.sleep(1)
-
-            if not self.disable_bf():  # Disable Beamformer signal to the RxDoc.
-                self.logger.critical('RxDoc disable beamformer signal FAILED')
-            else:
-                self.logger.info('RxDoc disable beamformer signal PASSED')
-
-            time.sleep(1)
+                self.logger.info('I2C test PASSED: voltage=%5.2f V, current=%4.0f mA, temp=%4.1f C',
+                                 self.voltage, self.current * 1000, self.temp)
 
-            if not self.turnoff_doc():  # Power to the RxDoC.
-                self.logger.critical('RxDoC power off FAILED')
-            else:
-                self.logger.info('RxDoC power off PASSED')
+            self.logger.info('State of OPMODE jumper is %s', self.opmode)  # Pin is tested by check() method.
 
-            time.sleep(1)
+            next_t = _sleep_until(next_t + 1)
 
-            if not self.turnoff_serial():  # Power to the serial comms to the BL233 chip for the SPIUHandler().
-                self.logger.critical('Serial power off FAILED')
-            else:
-                self.logger.info('Serial power off PASSED')
+            for method, desc in power_off:
+                if not method(verify=True):
+                    self.logger.critical('%s FAILED', desc)
+                else:
+                    self.logger.info('%s PASSED', desc)
+                next_t = _sleep_until(next_t + 1)
 
-            time.sleep(1)
+    def poweron_bf(self):
+        """
+        Power up the beamformer - turn on the RxDoC card, wait for it to settle, then enable the beamformer. The
+        lock isn't held while waiting, so check() and the OPMODE edge callback aren't blocked - if another thread
+        turns the RxDoC card off in the meantime, the beamformer isn't enabled.
 
-            if not self.turnoff_aux():  # Power to the fibre media converter for network access.
-                self.logger.critical('AUX power off FAILED')
-            else:
-                self.logger.info('AUX power off PASSED')
+        Return True if there were no errors, False if there was an error.
 
-            time.sleep(1)
+        :return: boolean, True for success, False for failure
+        """
+        self.logger.debug('BFIFHandler - Turning ON 48V to DoC card and beamformer')
+        with self.lock:
+            if not self._turnon_doc_locked():
+                return False
+        time.sleep(DOC_SETTLE_TIME)
+        with self.lock:
+            if not self.docpower:
+                self.logger.error('BFIFHandler - DoC card was turned off while settling, not enabling beamformer')
+                return False
+            return self._set_pin_locked(BFENABLE, 1, 'bfenabled')
 
     def cleanup(self):
         """
@@ -468,15 +678,19 @@ class BFIFHandler(object):
         """
         with self.lock:
             self.logger.info('BFIFHandler - turning off Beamformer, DoC')
-            ok1 = self.disable_bf()
-            if not ok1:
-                self.logger.error('BFIFHandler - Error turning off beamformer')
-            ok2 = self.turnoff_doc()
-            if not ok2:
-                self.logger.error('BFIFHandler - Error turning off DoC card')
-            ok3 = self.turnoff_rfof()
-            if not ok3:
-                self.logger.error('BFIFHandler - Error turning off RFoF power')
+            # Disable the beamformer, turn off the DoC card, and turn off the RFoF modules (active low), in that
+            # order - with three back-to-back register writes if the GPIO registers are mapped, otherwise with one
+            # RPi.GPIO call, which writes the pins in the order given.
+            if GPIOMEM is None:
+                GPIO.output((BFENABLE, DOCPOWER, RFOFOFF), (0, 0, 1))
+            else:
+                fastgpio.set_low(BFENABLE)
+                fastgpio.set_low(DOCPOWER)
+                fastgpio.set_high(RFOFOFF)
+            self.bfenabled = False
+            self.docpower = False
+            self.rfof = False
+            self._update_status()
 
     def __repr__(self):
         """
@@ -484,27 +698,24 @@ class BFIFHandler(object):
 
         :return: string describing the object status.
         """
-        self.check()
-        BDICT = {False:'OFF', True:'ON', None:'ERROR!'}
-
-        params = (BDICT[self.docpower],
-                  BDICT[self.bfenabled],
-                  BDICT[self.rfof],
-                  BDICT[self.auxpower],
-                  BDICT[self.serialpower],
-                  self.serialmode,
-                  self.opmode)
+        self.check()  # Re-uses the last sensor readings, if they're less than self._check_ttl seconds old
+        status = self._status  # Consistent snapshot of the state, without needing the lock - see _update_status()
+        bdict = self._BDICT
+
+        params = (bdict[status['docpower']],
+                  bdict[status['bfpower']],
+                  bdict[status['rfof']],
+                  bdict[status['auxpower']],
+                  bdict[status['serialpower']],
+                  status['serialmode'],
+                  status['opmode'])
         outs = "BFIFHandler: Flags: docpower=%3s, bfpower=%3s, RFoF=%3s, Aux=%3s, SerialPower=%3s, SerialMode=%s, OpMode=%s\n" % params
 
-        params = (self.voltage,
-                  self.current * 1000,
-                  self.temp)
+        params = (status['voltage'],
+                  status['current'] * 1000,
+                  status['temp'])
         outs += "BFIFHandler: Values: voltage=%5.2f V, current=%4.0f mA, temp=%4.1f C\n" % params
 
         return outs
 
-    def __str__(self):
-        """
-        :return: string describing the object status.
-        """
-        return self.__repr__()
+    __str__ = __repr__
@@ -11,6 +11,7 @@ import atexit
 import logging
 import signal
 import sys
+import threading
 import time
 
 logging.basicConfig(level=logging.INFO)
@@ -20,37 +21,31 @@ import bfif
 from mwabf import beamformer
 
 
-ALLDELAYS = {'Z':('Zen', [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]),
-             'A':('DipA', [0, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32]),
-             'B':('DipB', [32, 0, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32]),
-             'C':('DipC', [32, 32, 0, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32]),
-             'D':('DipD', [32, 32, 32, 0, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32]),
-             'E':('DipE', [32, 32, 32, 32, 0, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32]),
-             'F':('DipF', [32, 32, 32, 32, 32, 0, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32]),
-             'G':('DipG', [32, 32, 32, 32, 32, 32, 0, 32, 32, 32, 32, 32, 32, 32, 32, 32]),
-             'H':('DipH', [32, 32, 32, 32, 32, 32, 32, 0, 32, 32, 32, 32, 32, 32, 32, 32]),
-             'I':('DipI', [32, 32, 32, 32, 32, 32, 32, 32, 0, 32, 32, 32, 32, 32, 32, 32]),
-             'J':('DipJ', [32, 32, 32, 32, 32, 32, 32, 32, 32, 0, 32, 32, 32, 32, 32, 32]),
-             'K':('DipK', [32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 0, 32, 32, 32, 32, 32]),
-             'L':('DipL', [32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 0, 32, 32, 32, 32]),
-             'M':('DipM', [32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 0, 32, 32, 32]),
-             'N':('DipN', [32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 0, 32, 32]),
-             'O':('DipO', [32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 0, 32]),
-             'P':('DipP', [32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 0]),
-             None:('', [0] * 16)}
-
-DELDELAYS = {'0':('None', [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]),
-             '1':('Del1', [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1]),
-             '2':('Del2', [2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2]),
-             '3':('Del3', [4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4]),
-             '4':('Del4', [8, 8, 8, 8, 8, 8, 8, 8, 8, 8, 8, 8, 8, 8, 8, 8]),
-             '5':('Del5', [16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16]),
-             '6':('All ', [31, 31, 31, 31, 31, 31, 31, 31, 31, 31, 31, 31, 31, 31, 31, 31]),
-             '7':('Off ', [32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32, 32]),
-             None:('', [0] * 16)}
+# Test pointings for each dipole - zero delay on that dipole, and all the others turned off (delay 32).
+ALLDELAYS = {'Z':('Zen', (0,) * 16)}
+ALLDELAYS.update({dipole:('Dip%s' % dipole, tuple(0 if i == j else 32 for j in range(16)))
+                  for i, dipole in enumerate('ABCDEFGHIJKLMNOP')})
+ALLDELAYS[None] = ('', (0,) * 16)
+
+# Test pointings for each delay line - the same delay on all dipoles.
+DELDELAYS = {'0':('None', (0,) * 16),
+             '1':('Del1', (1,) * 16),
+             '2':('Del2', (2,) * 16),
+             '3':('Del3', (4,) * 16),
+             '4':('Del4', (8,) * 16),
+             '5':('Del5', (16,) * 16),
+             '6':('All ', (31,) * 16),
+             '7':('Off ', (32,) * 16),
+             None:('', (0,) * 16)}
+
+# Bitstrings for every pointing in ALLDELAYS and DELDELAYS, generated once at startup instead of on every test.
+ALLBITSTRINGS = {key:beamformer.gen_bitstring(delays, delays) for key, (name, delays) in ALLDELAYS.items()}
+DELBITSTRINGS = {key:beamformer.gen_bitstring(delays, delays) for key, (name, delays) in DELDELAYS.items()}
 
 NTESTS, NFAILED = 0, 0  # Number of total pointings in the current mode, and number of failed pointings.
 
+STOP_EVENT = threading.Event()  # Set (by moving the OPMODE jumper) to end the tests after the current pointing.
+
 SIGNAL_HANDLERS = {}
 CLEANUP_FUNCTION = None
 
@@ -72,63 +67,71 @@ test delays 0, 2 and 4.
 """
 
 
+def opmode_changed(opmode):
+    """
+    Called by the BFIFHandler, from the GPIO event thread, when the OPMODE jumper is moved. Moving the jumper to
+    'True' stops the tests after the current pointing, without having to wait for, or interrupt, the loop.
+
+    :param opmode: New state of the OPMODE jumper
+    :return: None
+    """
+    if opmode:
+        LOGGER.info('OPMODE jumper set, stopping tests.')
+        STOP_EVENT.set()
+
+
 def mainloop(modes=None, maxloops=1, delaytime=0.0):
     global NTESTS, NFAILED
-    NTESTS, NFAILED = 0, 0
+    ntests, nfailed = 0, 0  # Local counters, copied back to NTESTS and NFAILED (for shutdown()) on exit.
     nloops = 0
 
     if modes is None:
         modes = ['DIPOLE']
 
-    while (maxloops == 0) or (nloops < maxloops):
-        for mode in modes:
-            if 'DIPOLE' in mode:
-                if len(mode) == len('DIPOLE'):
-                    dlist = 'ABCDEFGHIJKLMNOP'
-                else:
-                    dlist = mode[len('DIPOLE'):]
-            elif 'DELAY' in mode:
-                if len(mode) == len('DELAY'):
-                    dlist = '0123456'
-                else:
-                    dlist = mode[len('DELAY'):]
-            else:
-                dlist = '01234567'
-
-            for delayindex in dlist:
+    try:
+        while (maxloops == 0) or (nloops < maxloops):
+            for mode in modes:
                 if 'DIPOLE' in mode:
-                    delayname, currdelays = ALLDELAYS[delayindex]
+                    dlist = mode[len('DIPOLE'):] or 'ABCDEFGHIJKLMNOP'  # Default to all dipoles
+                    delaytable, bitstrings = ALLDELAYS, ALLBITSTRINGS
+                    linefmt = 'Dipole %s: Temp=%4.1f Flags=%02x  %s'
                 elif 'DELAY' in mode:
-                    delayname, currdelays = DELDELAYS[delayindex]
+                    dlist = mode[len('DELAY'):] or '0123456'  # Default to all delay lines
+                    delaytable, bitstrings = DELDELAYS, DELBITSTRINGS
+                    linefmt = 'Delay %s: Temp=%4.1f Flags=%02x  %s'
                 else:
-                    delayname, currdelays = ALLDELAYS[None]
+                    dlist = [None] * 8
+                    delaytable, bitstrings = ALLDELAYS, ALLBITSTRINGS
+                    linefmt = 'Delay %s: Temp=%4.1f Flags=%02x  %s'
+
+                for delayindex in dlist:
+                    if STOP_EVENT.is_set():
+                        return
+
+                    delayname, currdelays = delaytable[delayindex]
+
+                    # Do the tests and increment the counter/s
+                    temp, flags = BF.point(xdelays=currdelays, ydelays=currdelays, bitstring=bitstrings[delayindex])
+                    ntests += 1
+                    if (flags != 0x80):  # If there's a comms failure, and it's NOT the first test, increment the fail count
+                        nfailed += 1
+                        badstr = '** BAD **'
+                    else:
+                        badstr = '         '
 
-                temp, flags = BF.point(xdelays=currdelays, ydelays=currdelays)  # Do the tests and increment the counter/s
-                NTESTS += 1
-                if (flags != 0x80):  # If there's a comms failure, and it's NOT the first test, increment the fail count
-                    NFAILED += 1
-                    badstr = '** BAD **'
-                else:
-                    badstr = '         '
+                    print(linefmt % (delayname, temp, flags, badstr))
 
-                if 'DIPOLE' in mode:
-                    print('Dipole %s: Temp=%4.1f Flags=%02x  %s' % (delayname, temp, flags, badstr))
-                else:
-                    print('Delay %s: Temp=%4.1f Flags=%02x  %s' % (delayname, temp, flags, badstr))
-
-                if (divmod(NTESTS, 100)[1] == 0):   # Every 100th test:
-                    print('Test %04d, of which %04d were bad' % (NTESTS, NFAILED))
+                    if ntests % 100 == 0:   # Every 100th test:
+                        print('Test %04d, of which %04d were bad' % (ntests, nfailed))
 
-                if delaytime == 0.0:
-                    if sys.version_info[0] == 3:
+                    if delaytime == 0.0:
                         input('Press ENTER to continue: ')
                     else:
-                        # noinspection PyUnresolvedReferences
-                        raw_input('Press ENTER to continue: ')
-                else:
-                    time.sleep(delaytime)
+                        STOP_EVENT.wait(delaytime)
 
-        nloops += 1
+            nloops += 1
+    finally:
+        NTESTS, NFAILED = ntests, nfailed
 
 
 def shutdown():
@@ -192,16 +195,15 @@ if __name__ == '__main__':
 
     bfif.setup_gpio()  # Need to call this before using the library
 
-    BFIF = bfif.BFIFHandler(logger=LOGGER)
-    # Turn on the beamformer
-    BFIF.turnon_doc()
-    time.sleep(0.5)
-    BFIF.enable_bf()
+    BFIF = bfif.BFIFHandler(logger=LOGGER, opmode_callback=opmode_changed)
+    BFIF.poweron_bf()  # Turn on the beamformer
     time.sleep(2)
 
-    BFIF.check()
+    BFIF.check(force=True)
     print("RxDoC card status: Voltage=%5.2f V, Current=%5.3f A, Temp=%4.1f degC" % (BFIF.voltage, BFIF.current, BFIF.temp))
 
+    beamformer.set_realtime(logger=LOGGER)  # Keep bit timing steady while sending pointings
+
     BF = beamformer.BFHandler(txdata=bfif.TXDATA,
                               rxdata=bfif.RXDATA,
                               txclock=bfif.TXCLOCK,
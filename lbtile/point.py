@@ -80,15 +80,14 @@ if __name__ == '__main__':
     bfif.setup_gpio()  # Need to call this before using the library
 
     BFIF = bfif.BFIFHandler(logger=LOGGER)
-    # Turn on the beamformer
-    BFIF.turnon_doc()
-    time.sleep(0.5)
-    BFIF.enable_bf()
+    BFIF.poweron_bf()  # Turn on the beamformer
     time.sleep(2)
 
-    BFIF.check()
+    BFIF.check(force=True)
     print("RxDoC card status: Voltage=%5.2f V, Current=%5.3f A, Temp=%4.1f degC" % (BFIF.voltage, BFIF.current, BFIF.temp))
 
+    beamformer.set_realtime(logger=LOGGER)  # Keep bit timing steady while sending the pointing
+
     BF = beamformer.BFHandler(txdata=bfif.TXDATA,
                               rxdata=bfif.RXDATA,
                               txclock=bfif.TXCLOCK,
@@ -98,10 +97,6 @@ if __name__ == '__main__':
     BF.point(xdelays=delays, ydelays=delays)
     print("Tile pointed to Azimuth=%5.1f, Elevation=%4.1f" % (args.az, args.alt))
 
-    if sys.version_info[0] == 3:
-        input('Press ENTER to turn off beamformer, and exit: ')
-    else:
-        # noinspection PyUnresolvedReferences
-        raw_input('Press ENTER to turn off beamformer, and exit: ')
+    input('Press ENTER to turn off beamformer, and exit: ')
 
     RegisterCleanup(shutdown)  # Trap signals and register the cleanup() function to be run on exit.
@@ -1,15 +1,218 @@
 
+import contextlib
+import ctypes
+import functools
 import logging
+import os
 import threading
 import time
 
 # noinspection PyUnresolvedReferences
 import RPi.GPIO as GPIO
-# noinspection PyUnresolvedReferences
-import smbus
+
+try:
+    # noinspection PyUnresolvedReferences
+    import pigpio
+except ImportError:
+    pigpio = None
+
+from mwabf.fastgpio import BOARD_TO_BCM, GPSET0, GPCLR0, GPLEV0, get_gpiomem
 
 logging.basicConfig()
 
+# Maps each bitstring byte (0 or 1) to the register that has to be written to send that bit on TXDATA.
+DATAREGS = bytes.maketrans(b'\x00\x01', bytes((GPCLR0, GPSET0)))
+
+PI = None  # Shared pigpio.pi() connection, created on first use.
+WAVE_LOCK = threading.Lock()  # The pigpio daemon only has one set of waveforms, so only one BFHandler can use it at a time.
+
+BITTIME_NS = 20000  # Default time to send each bit to the beamformer, in nanoseconds (a 50 kHz clock).
+
+PACKET_HEADER = 0b1111 << 20  # First 32 bits of every packet sent to the beamformer - 8 zeroes, 4 ones, 20 zeroes.
+
+BITVALUES = bytes.maketrans(b'01', b'\x00\x01')  # Translates ASCII '0' and '1' characters to bytes with values 0 and 1
+
+MCL_CURRENT = 1  # mlockall() flags from <sys/mman.h> on Linux - lock all pages mapped now, and all mapped in future.
+MCL_FUTURE = 2
+
+
+def get_pigpio():
+    """
+    Return a pigpio.pi() connection to the local pigpio daemon, shared by all BFHandler instances, or None if
+    the pigpio library isn't installed or the daemon isn't running.
+
+    :return: pigpio.pi() instance, or None
+    """
+    global PI
+    if pigpio is None:
+        return None
+    if PI is None:
+        PI = pigpio.pi()
+    if not PI.connected:
+        return None
+    return PI
+
+
+def _isolated_cpus():
+    """
+    Return the set of CPU numbers that the kernel was told to keep other tasks off, with the isolcpus= boot
+    parameter, or an empty set if there aren't any.
+
+    :return: set of integers
+    """
+    try:
+        with open('/sys/devices/system/cpu/isolated') as f:
+            cpulist = f.read().strip()  # eg '3', or '2-3', or '' if there are no isolated CPUs
+    except OSError:
+        return set()
+    cpus = set()
+    for part in cpulist.split(','):
+        if part:
+            first, _, last = part.partition('-')
+            cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def _lock_memory():
+    """
+    Lock all of the process's current and future memory pages into RAM with mlockall(), so that a page fault
+    (eg, on a page that's been swapped out, or a newly allocated one) can't stall the process part way through
+    a pointing.
+
+    :return: None
+    :raises OSError: If the pages couldn't be locked
+    """
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.mlockall(MCL_CURRENT | MCL_FUTURE) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+
+def set_realtime(priority=80, logger=logging, cpus=None):
+    """
+    Switch the calling process to the SCHED_FIFO real-time scheduling class, so that the bit-banged beamformer
+    comms aren't pre-empted by other processes part way through a pointing. Needs root, or CAP_SYS_NICE - if
+    that isn't available, logs a warning and carries on with normal scheduling.
+
+    The process is also pinned to the given CPUs, or if cpus is None, to any CPUs isolated from the rest of the
+    system at boot time - eg, by adding 'isolcpus=3 nohz_full=3 rcu_nocbs=3 irqaffinity=0-2' to
+    /boot/cmdline.txt, which keeps other tasks, timer ticks, RCU callbacks and interrupts off CPU 3.
+
+    If running as root, the process's memory is also locked into RAM, so that page faults can't add jitter. This
+    isn't done otherwise, because an unprivileged process that locks its future pages would get allocation
+    failures once it reached the (small) RLIMIT_MEMLOCK limit.
+
+    Intended to be called once, from a script's startup code, not from library code.
+
+    :param priority: SCHED_FIFO priority, 1-99
+    :param logger: Optional logging.Logger() instance
+    :param cpus: Optional set of CPU numbers to run on. If None, use the isolated CPUs (if there are any).
+    :return: True if the scheduling class was changed, False if not.
+    """
+    if cpus is None:
+        cpus = _isolated_cpus()
+    if cpus:
+        try:
+            os.sched_setaffinity(0, cpus)
+            logger.debug('Pinned to CPU(s) %s' % sorted(cpus))
+        except (AttributeError, OSError) as err:
+            logger.warning("Can't set CPU affinity: %s" % err)
+    if os.geteuid() == 0:
+        try:
+            _lock_memory()
+            logger.debug('Locked process memory into RAM')
+        except (AttributeError, OSError) as err:  # AttributeError if there's no mlockall() in the C library
+            logger.warning("Can't lock process memory: %s" % err)
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+    except (AttributeError, OSError) as err:  # AttributeError on non-Linux platforms
+        logger.warning("Can't switch to real-time scheduling: %s" % err)
+        return False
+    logger.debug('Switched to SCHED_FIFO scheduling, priority %d' % priority)
+    return True
+
+
+def _spin(ns):
+    """
+    Busy-wait for the given number of nanoseconds. Used instead of time.sleep() for the few-microsecond delays
+    between clock edges, because time.sleep() can't sleep for less than ~50-100us on a Raspberry Pi, and
+    returns after a very variable delay.
+
+    :param ns: Time to wait, in nanoseconds
+    :return: None
+    """
+    deadline = time.perf_counter_ns() + ns
+    while time.perf_counter_ns() < deadline:
+        pass
+
+
+@functools.lru_cache(maxsize=128)
+def _pack_delays(delays):
+    """
+    Given a bytes object containing the 16 x delays followed by the 16 y delays (already checked to be 0-63),
+    return the bitstring to send to the beamformer, as a bytes object with one byte (0 or 1) per bit. See
+    BFHandler._gen_bitstring() for the packet format.
+
+    The results are cached, because the same few pointings tend to be sent over and over again.
+
+    :param delays: bytes object containing the 32 delay values
+    :return: bytes object containing the bitstring to send to the beamformer
+    """
+    packed = 0  # All 32 delay values, packed into a single 192-bit integer
+    for val in delays:
+        packed = (packed << 6) | val
+    # The checksum is the twelve 16-bit words XORed together - fold the 192 bits in half, then in half again, then
+    # XOR the three remaining words.
+    folded = (packed ^ (packed >> 96)) & ((1 << 96) - 1)
+    folded = (folded ^ (folded >> 48)) & ((1 << 48) - 1)
+    checksum = (folded ^ (folded >> 16) ^ (folded >> 32)) & 0xFFFF
+    outbits = PACKET_HEADER  # Header bits in packet, before delay values.
+    for shift in range(11 * 16, -1, -16):  # Split the packed delays into twelve 16-bit words, first word first.
+        outbits = (outbits << 17) | (((packed >> shift) & 0xFFFF) << 1) | 1  # Each word is followed by a '1' bit.
+    outbits = (outbits << 16) | checksum  # Append checksum bits to the end of the packet.
+    return format(outbits, '0252b').encode('ascii').translate(BITVALUES)  # Output data, one byte per bit.
+
+
+def gen_bitstring(xdelays, ydelays):
+    """
+    Given two sequences of 16 integers (each 0-63), return the bitstring to send to the beamformer, as a bytes
+    object with one byte (0 or 1) per bit. See BFHandler._gen_bitstring() for the packet format.
+
+    Raises ValueError if the delays aren't valid. Can be used to pre-compute the bitstrings for a fixed set of
+    pointings, to pass to BFHandler.point().
+
+    :param xdelays: Sequence of 16 integer delays for individual dipoles in X, each 0-63
+    :param ydelays: Sequence of 16 integer delays for individual dipoles in Y, each 0-63
+    :return: bytes object containing the bitstring to send to the beamformer
+    """
+    try:
+        ok = (len(xdelays) == 16) and (len(ydelays) == 16)
+    except TypeError:  # Not a sequence
+        ok = False
+    if not ok:
+        raise ValueError('must pass a sequence of 16 integers in xdelays and ydelays')
+    delays = tuple(xdelays) + tuple(ydelays)
+    if not all(type(val) is int for val in delays):  # Not isinstance(), so that True and False are rejected
+        raise ValueError('delay values must be integers.')
+    if (min(delays) < 0) or (max(delays) > 63):
+        raise ValueError('delay values must be 0-63.')  # Each delay value must fit in 6 bits.
+    return _pack_delays(bytes(delays))
+
+
+def _decode_readback(inbits):
+    """
+    Given the 25 bits read back from the beamformer after a pointing (first bit in the most significant
+    position), return the beamformer temperature and the flags.
+
+    :param inbits: Integer containing the 25 bits read back
+    :return: Tuple of (temp, flags), where temp is a float in deg C, and flags is an int
+    """
+    rawtemp = inbits >> 8  # Convert the first 17 bits to a temperature
+    temp = 0.0625 * (rawtemp & 0xfff)  # 12 bits of value
+    if (rawtemp & 0x1000):
+        temp -= 256.0
+    return temp, inbits & 0xFF  # Last 8 bits are the flags
+
 
 ##################################################################################
 #
@@ -27,6 +230,8 @@ class BFHandler(object):
     the RxDoC card is plugged into.
     """
 
+    _TEST_DELAYS = list(range(16))  # Delay values (in both X and Y) sent by test_bf()
+
     def __init__(self, txdata, rxdata, txclock, logger=logging):
         """
         Create a new beamformer instance, given the IO pin numbers needed to control it.
@@ -47,6 +252,17 @@ class BFHandler(object):
         self.last_pointing = 0, None, None  # Contains a tuple of  (time.time(),xdelays,ydelays) for the last pointing command.
         self.standby_mode = False  # This will be True in Standby mode, False in normal mode.
 
+        # If the pigpio daemon is running, use a DMA-timed waveform to clock out the bitstring.
+        self.pi = get_pigpio()
+        if self.pi is not None:
+            self.pi.set_mode(BOARD_TO_BCM[txdata], pigpio.OUTPUT)
+            self.pi.set_mode(BOARD_TO_BCM[txclock], pigpio.OUTPUT)
+            self.pi.set_mode(BOARD_TO_BCM[rxdata], pigpio.INPUT)
+            logger.debug('BFHandler - Using pigpio waveforms for beamformer comms')
+
+        # If we can map the GPIO registers, write to them directly instead of going through RPi.GPIO.
+        self.gpiomem = get_gpiomem()
+
     def get_status(self):
         """
         Return a dict containing the current status data.
@@ -79,8 +295,8 @@ class BFHandler(object):
 
     def _gen_bitstring(self, xdelays, ydelays):
         """
-        Given two arrays of 16 integers (each 0-63), representing the xdelays and ydelays, return
-        a string containing 253 characters, each '1' or '0', representing the bit stream
+        Given two sequences (eg lists, tuples or ranges) of 16 integers (each 0-63), representing the xdelays and ydelays, return
+        a bytes object containing 253 bytes, each 1 or 0, representing the bit stream
         to be sent to the beamformer.
 
         Format is:
@@ -94,61 +310,69 @@ class BFHandler(object):
             16 bits of checksum (the twelve 16-bit packed delay words XORed together)
             A '1' bit to mark the end of the 13th 16-bit word
 
-            These 253 bits are returned as a string with 253 '1' and '0' characters.
+            These 253 bits are returned as a bytes object, with one byte (0 or 1) per bit.
 
             After those bits are clocked out, a further 24 clock pulses should be sent, and
             24 bits of data (16 bits containing a 12-bit signed temperature, and 8 bits of
             flags) will be received.
 
             Returns None if there was an error creating the bitstring (due to invalid delay values),
-            or a string containing 253 '1's and '0's to send to the beamformer.
+            or a bytes object containing 253 0's and 1's to send to the beamformer.
 
-        :param xdelays: List of 16 integer delays for individual dipoles in X, each 0-32
-        :param ydelays: List of 16 integer delays for individual dipoles in Y, each 0-32
-        :return: None if there was an error in the passed delays, or a string containing the bitstring
+        :param xdelays: Sequence of 16 integer delays for individual dipoles in X, each 0-32
+        :param ydelays: Sequence of 16 integer delays for individual dipoles in Y, each 0-32
+        :return: None if there was an error in the passed delays, or a bytes object containing the bitstring
                    to send to the receiver.
         """
-        if ((type(xdelays) != list) or (type(ydelays) != list) or
-                (len(xdelays) != 16) or (len(ydelays) != 16)):
-            self.logger.error('BFHandler - must pass a list of 16 integers in xdelays and ydelays')
+        try:
+            return gen_bitstring(xdelays=xdelays, ydelays=ydelays)
+        except ValueError as err:
+            self.logger.error('BFHandler - %s' % err)
             return None
-        outlist = ['0' * 8, '1' * 4, '0' * 20]  # Header bits in packet, before delay values.
-        dwords = []
-        for val in (xdelays + ydelays):
-            if (type(val) != int) or (val < 0) or (val > 63):
-                self.logger.error('BFHandler - delay values must be integers.')
-                return None  # Each delay value must be an integer, and must fit in 6 bits.
-            else:
-                dwords.append('{0:06b}'.format(val))
-        dstring = ''.join(dwords)
-        checksum = 0
-        for i in range(0, 12 * 16, 16):
-            checksum = checksum ^ int(dstring[i:i + 16], 2)
-            outlist.append(dstring[i:i + 16] + '1')
-        outlist.append('{0:016b}'.format(checksum))  # Append checksum bits to the end of the packet.
-        return ''.join(outlist)  # 253 bits of output data, as ASCII '1' and '0' characters.
-
-    def _send_bitstring(self, outstring, bittime=0.00002):
-        """
-        Given a string of 253 '1' or '0' characters, clock them out using the TXDATA and TXCLOCK
+
+    def _send_bitstring(self, outstring, bittime_ns=BITTIME_NS):
+        """
+        Given a bytes object of 253 1's or 0's, clock them out using the TXDATA and TXCLOCK
         pins, then clock in 24 bits of temp and flag data from the RXDATA pin.
 
         Returns a tuple of (temp, flags) where 'temp' is the beamformer temperature in deg C, and
         'flags' is the flag value (128 if there were no comms errors).
 
-        :param outstring: String containing 253 '1's and '0's to send to the beamformer
-        :param bittime: Total time to send one bit of data, in seconds.
+        :param outstring: Bytes object containing 253 1's and 0's to send to the beamformer
+        :param bittime_ns: Total time to send one bit of data, in integer nanoseconds.
         :return: Tuple of (temp, flags), where temp is a float containing beamformer temperature, and flags is an int
                  which should be equal to 128 if the communications were successful.
         """
+        quarter = bittime_ns // 4  # A quarter of the bit time, in nanoseconds
+        # Bind everything used inside the bit loops to local names, which are much faster to look up
+        # than globals and attributes.
+        txdata, txclock, rxdata = self.txdata, self.txclock, self.rxdata
+        output, spin = GPIO.output, _spin
         with self.lock:
-            for bit in outstring:
-                GPIO.output(self.txdata, {'1':1, '0':0}[bit])
-                time.sleep(bittime / 4)  # wait for data bit to settle
-                GPIO.output(self.txclock, 1)  # Send clock high
-                time.sleep(bittime / 2)  # Leave clock high for half the total bit transmit time
-                GPIO.output(self.txclock, 0)  # Send clock low,so data is valid on both rising and falling edge
-                time.sleep(bittime / 4)  # Leave data valid until the end of the bit transmit time
+            regs = self.gpiomem
+            if regs is not None:
+                datamask = 1 << BOARD_TO_BCM[txdata]
+                clockmask = 1 << BOARD_TO_BCM[txclock]
+                rxshift = BOARD_TO_BCM[rxdata]
+
+            if self.pi is not None:
+                self._send_wave(outstring=outstring, bittime_ns=bittime_ns)
+            elif regs is not None:
+                for datareg in outstring.translate(DATAREGS):
+                    regs[datareg] = datamask
+                    spin(quarter)  # wait for data bit to settle
+                    regs[GPSET0] = clockmask  # Send clock high
+                    spin(2 * quarter)  # Leave clock high for half the total bit transmit time
+                    regs[GPCLR0] = clockmask  # Send clock low,so data is valid on both rising and falling edge
+                    spin(quarter)  # Leave data valid until the end of the bit transmit time
+            else:
+                for bit in outstring:
+                    output(txdata, bit)
+                    spin(quarter)  # wait for data bit to settle
+                    output(txclock, 1)  # Send clock high
+                    spin(2 * quarter)  # Leave clock high for half the total bit transmit time
+                    output(txclock, 0)  # Send clock low,so data is valid on both rising and falling edge
+                    spin(quarter)  # Leave data valid until the end of the bit transmit time
 
             # While the temperature is 16 bits and the checksum is 8 bits, giving 24
             # bits in total, we appear to have to clock an extra bit-time to complete the
@@ -156,29 +380,79 @@ class BFHandler(object):
             # most) 8 bits, and the temperature is 13 bits (signed plus 12-bits). Both
             # values are most-significant-bit first (chronologically).
 
-            GPIO.output(self.txdata, 0)
-            inbits = []
-            for i in range(25):  # Read in temp data
-                time.sleep(bittime / 4)
-                GPIO.output(self.txclock, 1)
-                time.sleep(bittime / 4)
-                inbits.append({True:'1', False:'0'}[GPIO.input(self.rxdata)])
-                time.sleep(bittime / 4)
-                GPIO.output(self.txclock, 0)
-                time.sleep(bittime / 4)
-
-        rawtemp = int(''.join(inbits[:17]), 2)  # Convert the first 16 bits to a temperature
-        self.temp = 0.0625 * (rawtemp & 0xfff)  # 12 bits of value
-        if (rawtemp & 0x1000):
-            self.temp -= 256.0
-        self.flags = int(''.join(inbits[17:]), 2)
+            # The read-back is always done from Python (not pigpio or SPI), shifting each bit into an integer.
+            inbits = 0  # Shift register for the 25 bits read back
+            if regs is not None:
+                regs[GPCLR0] = datamask
+                for i in range(25):  # Read in temp data
+                    spin(quarter)
+                    regs[GPSET0] = clockmask
+                    spin(quarter)
+                    inbits = (inbits << 1) | ((regs[GPLEV0] >> rxshift) & 1)
+                    spin(quarter)
+                    regs[GPCLR0] = clockmask
+                    spin(quarter)
+            else:
+                read = GPIO.input
+                output(txdata, 0)
+                for i in range(25):  # Read in temp data
+                    spin(quarter)
+                    output(txclock, 1)
+                    spin(quarter)
+                    inbits = (inbits << 1) | read(rxdata)  # GPIO.input() returns 0 or 1
+                    spin(quarter)
+                    output(txclock, 0)
+                    spin(quarter)
+
+        self.temp, self.flags = _decode_readback(inbits)
         return self.temp, self.flags
 
-    def point(self, xdelays=None, ydelays=None):
+    def _send_wave(self, outstring, bittime_ns):
+        """
+        Clock out the bitstring using a pigpio waveform, so that the bit timing is generated by DMA instead of
+        by Python. The 25-bit read-back that follows is still done from Python, in _send_bitstring().
+
+        Each bit is sent as three pulses - set TXDATA and wait bittime/4, raise TXCLOCK for bittime/2,
+        then drop TXCLOCK and wait bittime/4. TXDATA is left low at the end, ready for the read-back.
+
+        Must be called with self.lock held.
+
+        :param outstring: Bytes object containing 253 1's and 0's to send to the beamformer
+        :param bittime_ns: Total time to send one bit of data, in integer nanoseconds.
+        :return: None
+        """
+        datamask = 1 << BOARD_TO_BCM[self.txdata]
+        clockmask = 1 << BOARD_TO_BCM[self.txclock]
+        quarter = max(1, (bittime_ns + 2000) // 4000)  # pigpio pulse lengths are in (rounded) microseconds
+        # There are only two different three-pulse sequences (for a 0 bit and a 1 bit), so create them once and
+        # index them by bit value - pigpio only reads the pulse objects, so they can appear in the list many times.
+        clock_high = pigpio.pulse(clockmask, 0, 2 * quarter)
+        clock_low = pigpio.pulse(0, clockmask, quarter)
+        bitpulses = ((pigpio.pulse(0, datamask, quarter), clock_high, clock_low),
+                     (pigpio.pulse(datamask, 0, quarter), clock_high, clock_low))
+        pulses = [pulse for bit in outstring for pulse in bitpulses[bit]]
+        pulses.append(pigpio.pulse(0, datamask, 0))
+
+        with WAVE_LOCK:
+            self.pi.wave_clear()
+            self.pi.wave_add_generic(pulses)
+            wid = self.pi.wave_create()
+            self.pi.wave_send_once(wid)
+            # Sleep (releasing the GIL for other threads) while the DMA engine sends the waveform, then poll for the
+            # last few microseconds.
+            time.sleep(len(outstring) * 4 * quarter / 1e6)
+            while self.pi.wave_tx_busy():
+                time.sleep(bittime_ns / 1e9)
+            self.pi.wave_delete(wid)
+
+    def point(self, xdelays=None, ydelays=None, bitstring=None):
         """
         Send a new pointing to the beamformer using the given xdelay and ydelay values (each a list of
         16 integers between 0 and 63).
 
+        If bitstring is given (pre-computed from the same xdelays and ydelays with gen_bitstring()), it's sent
+        as-is, instead of being generated from the delays.
+
         Returns a tuple of (temp, flags) where 'temp' is the beamformer temperature in deg C, and
         'flags' is the flag value (128 if there were no comms errors).
 
@@ -186,11 +460,15 @@ class BFHandler(object):
 
         :param xdelays: List of 16 integer delays for individual dipoles in X, each 0-32
         :param ydelays: List of 16 integer delays for individual dipoles in Y, each 0-32
+        :param bitstring: Optional bytes object returned by gen_bitstring(xdelays, ydelays)
         :return: Tuple of (temp, flags), where temp is a float containing beamformer temperature, and flags is an int
                  which should be equal to 128 if the communications were successful.
         """
         if not self.standby_mode:
-            outstring = self._gen_bitstring(xdelays=xdelays, ydelays=ydelays)
+            if bitstring is None:
+                outstring = self._gen_bitstring(xdelays=xdelays, ydelays=ydelays)
+            else:
+                outstring = bitstring
             self.last_pointing = (time.time(), xdelays, ydelays)
             result = self._send_bitstring(outstring=outstring)
             temp, flags = result
@@ -214,8 +492,83 @@ class BFHandler(object):
 
         while True:  # Loop forever in RFI test mode
             self.logger.info("sending new pointing...")
-            self.point(xdelays=range(16), ydelays=range(16))
+            self.point(xdelays=self._TEST_DELAYS, ydelays=self._TEST_DELAYS)
 
             self.logger.info("Status:")
             self.logger.info(self.__repr__())
             time.sleep(8)
+
+
+def point_many(bfs, xdelays=None, ydelays=None, bitstring=None):
+    """
+    Send the same pointing to several beamformers at once (eg, all eight in an EDA control box), each on its own
+    set of GPIO pins.
+
+    If the GPIO registers can be mapped, all the beamformers are clocked in parallel - every register write drives
+    the TXDATA (or TXCLOCK) pins of all of them at once, and each GPLEV0 read samples all of their RXDATA pins - so
+    pointing N beamformers takes the same time as pointing one. Otherwise, or if the delays are invalid, each
+    beamformer is pointed in turn with BFHandler.point().
+
+    Beamformers in standby mode are skipped, and get a result of (-999, 999), as from BFHandler.point().
+
+    :param bfs: Sequence of BFHandler instances, all using different GPIO pins
+    :param xdelays: List of 16 integer delays for individual dipoles in X, each 0-32
+    :param ydelays: List of 16 integer delays for individual dipoles in Y, each 0-32
+    :param bitstring: Optional bytes object returned by gen_bitstring(xdelays, ydelays), sent as-is if given
+    :return: List of (temp, flags) tuples, one for each beamformer in bfs, in the same order.
+    """
+    regs = get_gpiomem()
+    active = [bf for bf in bfs if not bf.standby_mode]
+    outstring = bitstring
+    if (outstring is None) and (regs is not None) and active:
+        outstring = active[0]._gen_bitstring(xdelays=xdelays, ydelays=ydelays)
+    if (regs is None) or (outstring is None):
+        return [bf.point(xdelays=xdelays, ydelays=ydelays, bitstring=outstring) for bf in bfs]
+
+    datamask = clockmask = 0
+    for bf in active:
+        datamask |= 1 << BOARD_TO_BCM[bf.txdata]
+        clockmask |= 1 << BOARD_TO_BCM[bf.txclock]
+    quarter = BITTIME_NS // 4
+    spin = _spin
+    levels = []  # Raw GPLEV0 values sampled during the read-back, one per bit.
+    with contextlib.ExitStack() as stack:
+        for bf in active:
+            stack.enter_context(bf.lock)
+        for datareg in outstring.translate(DATAREGS):
+            regs[datareg] = datamask
+            spin(quarter)  # wait for data bit to settle
+            regs[GPSET0] = clockmask  # Send clock high
+            spin(2 * quarter)  # Leave clock high for half the total bit transmit time
+            regs[GPCLR0] = clockmask  # Send clock low,so data is valid on both rising and falling edge
+            spin(quarter)  # Leave data valid until the end of the bit transmit time
+
+        # Read back 25 bits from every beamformer at once - see BFHandler._send_bitstring()
+        regs[GPCLR0] = datamask
+        for i in range(25):
+            spin(quarter)
+            regs[GPSET0] = clockmask
+            spin(quarter)
+            levels.append(regs[GPLEV0])
+            spin(quarter)
+            regs[GPCLR0] = clockmask
+            spin(quarter)
+
+    now = time.time()
+    for bf in active:
+        rxshift = BOARD_TO_BCM[bf.rxdata]
+        inbits = 0
+        for level in levels:
+            inbits = (inbits << 1) | ((level >> rxshift) & 1)
+        bf.temp, bf.flags = _decode_readback(inbits)
+        bf.last_pointing = (now, xdelays, ydelays)
+        bf.logger.debug('BFHandler - Beamformer sent new pointing. Flags=%d, temp=%4.1f' % (bf.flags, bf.temp))
+
+    results = []
+    for bf in bfs:
+        if bf in active:
+            results.append((bf.temp, bf.flags))
+        else:
+            bf.logger.warning('BFHandler - Beamformer in low-power mode, cannot send new pointing')
+            results.append((-999, 999))
+    return results
@@ -0,0 +1,98 @@
+
+import mmap
+import os
+
+# Map from Raspberry Pi header (GPIO.BOARD) pin numbers to Broadcom GPIO numbers, needed by pigpio and for
+# direct register access.
+BOARD_TO_BCM = {3:2, 5:3, 7:4, 8:14, 10:15, 11:17, 12:18, 13:27, 15:22, 16:23, 18:24, 19:10, 21:9, 22:25,
+                23:11, 24:8, 26:7, 27:0, 28:1, 29:5, 31:6, 32:12, 33:13, 35:19, 36:16, 37:26, 38:20, 40:21}
+
+# Offsets of the BCM2835/BCM2711 GPIO set, clear and level registers in /dev/gpiomem, in 32-bit words.
+GPSET0 = 0x1C // 4
+GPCLR0 = 0x28 // 4
+GPLEV0 = 0x34 // 4
+
+# Device tree 'compatible' strings for the SoCs with the above GPIO register layout (Pi 1 to Pi 4, Zero and CM4).
+GPIOMEM_SOCS = {b'brcm,bcm2835', b'brcm,bcm2836', b'brcm,bcm2837', b'brcm,bcm2711'}
+
+GPIOMEM = None  # Shared memoryview of the GPIO registers, created on first use - or False if they can't be mapped.
+
+
+def get_gpiomem():
+    """
+    Return a memoryview of the Raspberry Pi's GPIO registers (as 32-bit words), mapped from /dev/gpiomem and shared
+    by all users of this module, or None if this isn't a Pi with a BCM2835-family SoC (eg, on a Pi 5, where the
+    GPIO registers are in the RP1 chip instead, or on a non-Pi host), or /dev/gpiomem can't be opened.
+
+    The result is worked out on the first call, and remembered (whether it's a memoryview or None), so later calls
+    don't touch the filesystem.
+
+    Writing a bitmask to GPIOMEM[GPSET0] or GPIOMEM[GPCLR0] sets or clears those GPIO pins (using Broadcom pin
+    numbers), and GPIOMEM[GPLEV0] contains the current input levels.
+
+    :return: memoryview instance, or None
+    """
+    global GPIOMEM
+    if GPIOMEM is None:
+        GPIOMEM = _map_gpiomem() or False
+    return GPIOMEM or None
+
+
+def _map_gpiomem():
+    """
+    Map the GPIO registers from /dev/gpiomem. Called once, by get_gpiomem().
+
+    :return: memoryview instance, or None if the registers can't (or shouldn't) be mapped
+    """
+    # Only map the registers on a SoC with the BCM2835 GPIO register layout - writing to the wrong offsets
+    # on any other chip would toggle the wrong pins, or worse.
+    try:
+        with open('/proc/device-tree/compatible', 'rb') as f:
+            compatible = f.read().split(b'\x00')
+    except OSError:
+        return None
+    if not set(compatible) & GPIOMEM_SOCS:
+        return None
+    try:
+        fd = os.open('/dev/gpiomem', os.O_RDWR | os.O_SYNC)
+    except OSError:
+        return None
+    try:
+        return memoryview(mmap.mmap(fd, 4096)).cast('I')
+    except (OSError, ValueError):
+        return None
+    finally:
+        os.close(fd)
+
+
+def set_high(pin):
+    """
+    Set a GPIO output pin high, by writing directly to the GPSET0 register. Only valid after get_gpiomem() has
+    returned a memoryview (not None), and after the pin has been set up as an output with RPi.GPIO.
+
+    :param pin: Raspberry Pi header (GPIO.BOARD) pin number
+    :return: None
+    """
+    GPIOMEM[GPSET0] = 1 << BOARD_TO_BCM[pin]
+
+
+def set_low(pin):
+    """
+    Set a GPIO output pin low, by writing directly to the GPCLR0 register. Only valid after get_gpiomem() has
+    returned a memoryview (not None), and after the pin has been set up as an output with RPi.GPIO.
+
+    :param pin: Raspberry Pi header (GPIO.BOARD) pin number
+    :return: None
+    """
+    GPIOMEM[GPCLR0] = 1 << BOARD_TO_BCM[pin]
+
+
+def read(pin):
+    """
+    Return the current level (0 or 1) of a GPIO pin, read directly from the GPLEV0 register. Only valid after
+    get_gpiomem() has returned a memoryview (not None).
+
+    :param pin: Raspberry Pi header (GPIO.BOARD) pin number
+    :return: 0 or 1
+    """
+    return (GPIOMEM[GPLEV0] >> BOARD_TO_BCM[pin]) & 1
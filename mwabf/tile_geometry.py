@@ -1,6 +1,31 @@
 
+import functools
 import math
 
+DIP_SEP = 1.10  # dipole separations in meters
+DELAYSTEP = 435.0  # Delay line increment in picoseconds
+MAXDELAY = 31  # Maximum number of deltastep delays
+C = 0.000299798  # C in meters/picosecond
+DTOR = math.pi / 180.0  # convert degrees to radians
+
+# Offsets of the dipoles, relative to the center of the tile, with positive values being in the north
+# and east directions. These never change, so they're only calculated once, at import time.
+XOFFSETS = (-1.5 * DIP_SEP, -0.5 * DIP_SEP, 0.5 * DIP_SEP, 1.5 * DIP_SEP) * 4  # in the W-E 'x' direction
+YOFFSETS = ((1.5 * DIP_SEP,) * 4 + (0.5 * DIP_SEP,) * 4 +
+            (-0.5 * DIP_SEP,) * 4 + (-1.5 * DIP_SEP,) * 4)  # in the S-N 'y' direction
+
+# Candidate offsets tried when rounding the delays, from -0.45 to +0.45 delay steps, in 1/20th of a step increments
+OFFSETS = [-0.45 * DELAYSTEP]
+_offset = (-0.45 * DELAYSTEP) + (DELAYSTEP / 20.0)
+while _offset <= (0.45 * DELAYSTEP):
+    OFFSETS.append(_offset)
+    _offset += DELAYSTEP / 20.0
+OFFSETS = tuple(OFFSETS)
+del _offset
+
+# Triangles of dipoles (by dipole number) used to back out the pointing direction from a set of delays in delays2azel()
+TRIANGLES = ((0, 15, 12), (0, 15, 3), (3, 12, 15), (0, 3, 12))
+
 
 def calc_delays(az=0.0, el=0.0):
     """
@@ -34,133 +59,72 @@ def calc_delays(az=0.0, el=0.0):
 
                  S
     """
-    dip_sep = 1.10  # dipole separations in meters
-    delaystep = 435.0  # Delay line increment in picoseconds
-    maxdelay = 31  # Maximum number of deltastep delays
-    c = 0.000299798  # C in meters/picosecond
-    dtor = math.pi / 180.0  # convert degrees to radians
-    # define zenith angle
-    za = 90 - el
+    delays = _calc_delays(az, el)
+    if delays is None:
+        return None
+    return list(delays)  # A new list each time, so the caller can't modify the cached values
+
 
-    # Define arrays to hold the positional offsets of the dipoles
-    xoffsets = [0.0] * 16  # offsets of the dipoles in the W-E 'x' direction
-    yoffsets = [0.0] * 16  # offsets of the dipoles in the S-N 'y' direction
-    delays = [0.0] * 16  # The calculated delays in picoseconds
-    rdelays = [0] * 16  # The rounded delays in units of delaystep
+@functools.lru_cache(maxsize=1024)
+def _calc_delays(az, el):
+    """
+    Does the work for calc_delays(), returning the delays as a tuple (or None), so the cached result can't be
+    modified by a caller.
 
-    delaysettings = [0] * 16  # return values
+    :param az: Azimuth in degrees
+    :param el: Elevation in degrees
+    :return: Tuple of 16 integer delays, or None if the delays are out of range
+    """
+    delaystep = DELAYSTEP
+    maxdelay = MAXDELAY
+    # define zenith angle
+    za = 90 - el
 
     # Check input sanity
     if (abs(za) > 90):
-        return delaysettings
-
-        # Offsets of the dipoles are calculated relative to the
-        # center of the tile, with positive values being in the north
-        # and east directions
-
-    xoffsets[0] = -1.5 * dip_sep
-    xoffsets[1] = -0.5 * dip_sep
-    xoffsets[2] = 0.5 * dip_sep
-    xoffsets[3] = 1.5 * dip_sep
-    xoffsets[4] = -1.5 * dip_sep
-    xoffsets[5] = -0.5 * dip_sep
-    xoffsets[6] = 0.5 * dip_sep
-    xoffsets[7] = 1.5 * dip_sep
-    xoffsets[8] = -1.5 * dip_sep
-    xoffsets[9] = -0.5 * dip_sep
-    xoffsets[10] = 0.5 * dip_sep
-    xoffsets[11] = 1.5 * dip_sep
-    xoffsets[12] = -1.5 * dip_sep
-    xoffsets[13] = -0.5 * dip_sep
-    xoffsets[14] = 0.5 * dip_sep
-    xoffsets[15] = 1.5 * dip_sep
-
-    yoffsets[0] = 1.5 * dip_sep
-    yoffsets[1] = 1.5 * dip_sep
-    yoffsets[2] = 1.5 * dip_sep
-    yoffsets[3] = 1.5 * dip_sep
-    yoffsets[4] = 0.5 * dip_sep
-    yoffsets[5] = 0.5 * dip_sep
-    yoffsets[6] = 0.5 * dip_sep
-    yoffsets[7] = 0.5 * dip_sep
-    yoffsets[8] = -0.5 * dip_sep
-    yoffsets[9] = -0.5 * dip_sep
-    yoffsets[10] = -0.5 * dip_sep
-    yoffsets[11] = -0.5 * dip_sep
-    yoffsets[12] = -1.5 * dip_sep
-    yoffsets[13] = -1.5 * dip_sep
-    yoffsets[14] = -1.5 * dip_sep
-    yoffsets[15] = -1.5 * dip_sep
+        return (0,) * 16
 
     # First, figure out the theoretical delays to the dipoles
     # relative to the center of the tile
 
     # Convert to radians
-    azr = az * dtor
-    zar = za * dtor
+    azr = az * DTOR
+    zar = za * DTOR
 
-    for i in range(16):
-        # calculate exact delays in picoseconds from geometry...
-        delays[i] = (xoffsets[i] * math.sin(azr) + yoffsets[i] * math.cos(azr)) * math.sin(zar) / c
-
-    # Find minimum delay
-    mindelay = min(delays)
+    # calculate exact delays in picoseconds from geometry...
+    sin_az, cos_az, sin_za = math.sin(azr), math.cos(azr), math.sin(zar)  # The same for every dipole
+    delays = [(xoff * sin_az + yoff * cos_az) * sin_za / C
+              for xoff, yoff in zip(XOFFSETS, YOFFSETS)]
 
     # Subtract minimum delay so that all delays are positive
-    for i in range(16):
-        delays[i] -= mindelay
+    mindelay = min(delays)
+    delays = [delay - mindelay for delay in delays]
 
     # Now minimize the sum of the deviations^2 from optimal
     # due to errors introduced when rounding the delays.
-    # This is done by stepping through a series of offsets to
-    # see how the sum of square deviations changes
+    # This is done by stepping through the series of offsets in
+    # OFFSETS to see how the sum of square deviations changes
     # and then selecting the delays corresponding to the min sq dev.
-
-    # Go through once to get baseline values to compare
-    bestoffset = -0.45 * delaystep
-    minsqdev = 0
-
-    for i in range(16):
-        delay_off = delays[i] + bestoffset
-        intdel = int(round(delay_off / delaystep))
-
-        if (intdel > maxdelay):
-            intdel = maxdelay
-
-        minsqdev += math.pow((intdel * delaystep - delay_off), 2)
-
-    minsqdev = minsqdev / 16
-
-    offset = (-0.45 * delaystep) + (delaystep / 20.0)
-    while offset <= (0.45 * delaystep):
-        sqdev = 0
-        for i in range(16):
-            delay_off = delays[i] + offset
-            intdel = int(round(delay_off / delaystep))
-
-            if (intdel > maxdelay):
-                intdel = maxdelay
-            sqdev = sqdev + math.pow((intdel * delaystep - delay_off), 2)
-
-        sqdev = sqdev / 16
-        if (sqdev < minsqdev):
-            minsqdev = sqdev
-            bestoffset = offset
-
-        offset += delaystep / 20.0
-
-    for i in range(16):
-        rdelays[i] = int(round((delays[i] + bestoffset) / delaystep))
-        if (rdelays[i] > maxdelay):
-            if (rdelays[i] > maxdelay + 1):
-                return None  # Trying to steer out of range.
-            rdelays[i] = maxdelay
-
-    # Set the actual delays
-    for i in range(16):
-        delaysettings[i] = int(rdelays[i])
-
-    return delaysettings
+    # The rounding error is a sawtooth function of the offset, so
+    # there's no closed form for the best offset - but min() does
+    # the whole search in one pass, and returns the first of any
+    # equally good offsets, as the original loop did.
+    def sqdev(offset, _pow=math.pow):  # math.pow is bound as a default argument, to avoid a global lookup per dipole
+        """Sum of the squared rounding errors for all 16 dipoles, using the given offset."""
+        total = 0.0
+        for delay in delays:
+            delay_off = delay + offset
+            intdel = min(int(round(delay_off / delaystep)), maxdelay)
+            total += _pow((intdel * delaystep - delay_off), 2)
+        return total
+
+    bestoffset = min(OFFSETS, key=sqdev)
+
+    # The rounded delays in units of delaystep
+    rdelays = [int(round((delay + bestoffset) / delaystep)) for delay in delays]
+    if max(rdelays) > maxdelay + 1:
+        return None  # Trying to steer out of range.
+    return tuple(min(rdelay, maxdelay) for rdelay in rdelays)
 
 
 def triangulate(d1, ox1, oy1, d2, ox2, oy2, d3, ox3, oy3):
@@ -218,7 +182,19 @@ def delays2azel(xx):
     :param xx: a list of 16 dipole delays
     :return: a tuple of (azimuth,elevation)
     """
-    dip_sep = 1.10
+    return _delays2azel(tuple(xx))
+
+
+@functools.lru_cache(maxsize=1024)
+def _delays2azel(xx):
+    """
+    Does the work for delays2azel(). It's called from status and logging code, which reports the delays that are
+    currently set on the tile every time it runs - they only change when the tile is re-pointed, so between
+    pointings, each call is a cache hit instead of four triangulate() calls.
+
+    :param xx: a tuple of 16 dipole delays (any of which may be None)
+    :return: a tuple of (azimuth,elevation)
+    """
     delaystep = 435  # delay in picoseconds
     # dtor = 0.0174532925
 
@@ -230,29 +206,15 @@ def delays2azel(xx):
     azs = []
     zas = []
 
-    ii = [0, 0, 3, 0]
-    jj = [15, 15, 12, 3]
-    kk = [12, 3, 15, 12]
-
-    for a in range(len(ii)):
-        i = ii[a]
-        j = jj[a]
-        k = kk[a]
-
+    for i, j, k in TRIANGLES:
         d1 = delaystep * xx[i]
-        ox1 = (-1.5 + (i % 4) * 1.0) * dip_sep
-        oy1 = (1.5 - math.floor(i / 4)) * dip_sep
-
         d2 = delaystep * xx[j]
-        ox2 = (-1.5 + (j % 4) * 1.0) * dip_sep
-        oy2 = (1.5 - math.floor(j / 4)) * dip_sep
-
         d3 = delaystep * xx[k]
-        ox3 = (-1.5 + (k % 4) * 1.0) * dip_sep
-        oy3 = (1.5 - math.floor(k / 4)) * dip_sep
 
         try:
-            az, za = triangulate(d1, ox1, oy1, d2, ox2, oy2, d3, ox3, oy3)
+            az, za = triangulate(d1, XOFFSETS[i], YOFFSETS[i],
+                                 d2, XOFFSETS[j], YOFFSETS[j],
+                                 d3, XOFFSETS[k], YOFFSETS[k])
         except:  # AAVS delays can give math errors
             az, za = 0.0, 0.0
 